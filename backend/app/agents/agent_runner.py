@@ -1,5 +1,122 @@
+import os
 from app.agents.graph.data_agent import DataAgent
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader, SessionLoader, PARQUET_EXTENSIONS
+from app.agents.tools.schema_profile import profile_dataset, merge_profiles
+from app.redis_utils import get_file_metadata
+from app.s3_utils import (
+    S3_BUCKET_NAME, s3_cache, download_dataset, download_append_parts, upload_parquet_artifact, upload_append_part,
+    get_dataset_fingerprint, next_dataset_fingerprint,
+)
+from app.dataset_profiles import save_dataset_profile, get_dataset_profile
+from app.sessions import get_session, session_fingerprint
+from app.answer_cache import dataset_key
+from app.tracing import span
 
 def run_agent_on_csv(csv_path: str, question: str, file_id: str):
     agent = DataAgent(csv_path)
-    return agent.run(question, file_id=file_id)
+    return agent.run(question, file_id=file_id)["answer"]
+
+def load_dataset(file_id: str) -> CSVToDuckDBLoader:
+    # One metadata snapshot, so the appended parts, version and fingerprint all describe the same data
+    file_meta = get_file_metadata(file_id, use_cache=False)
+    local_path = download_dataset(file_id)
+    loader = CSVToDuckDBLoader(file_id=file_id)
+    loader.load_file(local_path)
+    if not local_path.lower().endswith(PARQUET_EXTENSIONS):
+        write_columnar_artifact(loader, file_id)  # before the parts are applied: the artifact is the base file only
+
+    for part_path in download_append_parts(file_meta or {}):
+        loader.append_parquet(part_path)
+    try:
+        loader.fingerprint = (file_meta or {}).get("fingerprint") or get_dataset_fingerprint(file_id)
+    except Exception as e:
+        print(f"[LOAD] Could not fingerprint {file_id}, caching answers per file_id: {e}")
+    try:
+        profile = get_dataset_profile(file_id)
+        loader.profile = profile if profile and profile.version == loader.version else None
+    except Exception as e:
+        print(f"[PROFILE] Could not read profile for {file_id}: {e}")
+    if loader.version:
+        loader.refresh_schema()
+    return loader
+
+def load_session(session_id: str) -> SessionLoader:
+    tables = get_session(session_id)
+    if not tables:
+        raise Exception(f"Session not found: {session_id}")
+
+    sources, fingerprints = {}, {}
+    for name, file_id in tables.items():
+        file_meta = get_file_metadata(file_id, use_cache=False)
+        if not file_meta:
+            raise Exception(f"File metadata not found for {file_id} in session {session_id}")
+        # Uploads not yet converted to Parquet are read from CSV; their own load writes the artifact
+        sources[name] = [download_dataset(file_id)] + download_append_parts(file_meta)
+        # Same per-member key as the API's session_dataset_key_async, or cached answers would never be found
+        fingerprints[name] = dataset_key(file_id, file_meta)
+
+    loader = SessionLoader(session_id, tables)
+    loader.load_tables(sources)
+    loader.fingerprint = session_fingerprint(fingerprints)
+    return loader
+
+def write_columnar_artifact(loader: CSVToDuckDBLoader, file_id: str):
+    # One-time conversion: later loads read typed Parquet instead of re-inferring types from text
+    parquet_path = f"/tmp/{file_id}.parquet"
+    try:
+        loader.export_parquet(parquet_path)
+        key = upload_parquet_artifact(file_id, parquet_path)
+        print(f"[LOAD] Stored columnar artifact for {file_id} at {key}")
+    except Exception as e:
+        print(f"[LOAD] Failed to store columnar artifact for {file_id}: {e}")
+    finally:
+        if os.path.exists(parquet_path):
+            os.remove(parquet_path)
+
+def write_dataset_profile(loader: CSVToDuckDBLoader, file_id: str):
+    # Computed once after upload; summary stats and default histograms are then answered without a scan
+    try:
+        with span("dataset_profile"):
+            profile = profile_dataset(loader.conn)
+        profile.version = loader.version
+        save_dataset_profile(file_id, profile)
+        loader.profile = profile
+        print(f"[PROFILE] Profiled {len(profile.columns)} columns of {file_id}")
+    except Exception as e:
+        print(f"[PROFILE] Failed to profile {file_id}: {e}")
+
+def append_chunk(loader: CSVToDuckDBLoader, file_id: str, chunk_key: str) -> dict:
+    # Caller holds the file's append lock. The part is stored and the metadata committed before the rows
+    # reach the pooled table, so a failed upload leaves both unchanged.
+    rows = loader.stage_chunk(s3_cache.fetch(S3_BUCKET_NAME, chunk_key))
+    part_path = f"/tmp/{file_id}.part-{loader.version + 1}.parquet"
+    try:
+        base = loader.profile
+        mergeable = base is not None and base.version == loader.version and all(c.hll for c in base.columns)
+        chunk_profile = profile_dataset(loader.conn, table="chunk", histograms=False) if mergeable else None
+
+        loader.export_chunk(part_path)
+        fingerprint = next_dataset_fingerprint(loader.fingerprint, chunk_key)
+        upload_append_part(file_id, part_path, loader.version + 1, fingerprint, chunk_key)
+        loader.insert_chunk()
+        loader.fingerprint = fingerprint
+
+        with span("dataset_profile"):
+            if mergeable:
+                loader.profile = merge_profiles(base, chunk_profile, loader.conn)
+            else:
+                loader.profile = profile_dataset(loader.conn)
+                loader.profile.version = loader.version
+        save_dataset_profile(file_id, loader.profile)
+        loader.refresh_schema()
+    finally:
+        loader.drop_chunk()
+        if os.path.exists(part_path):
+            os.remove(part_path)
+
+    print(f"[APPEND] {file_id}: +{rows} rows, version {loader.version} ({'merged' if mergeable else 'recomputed'} profile)")
+    return {"version": loader.version, "rows_appended": rows, "row_count": loader.profile.row_count}
+
+def run_agent_on_loader(loader: CSVToDuckDBLoader, question: str, file_id: str, task_id: str = None):
+    agent = DataAgent(file_id=file_id, loader=loader)
+    return agent.run(question, file_id=file_id, task_id=task_id)
@@ -1,49 +1,89 @@
-from langchain_community.chat_models import ChatOpenAI
+from langchain_openai import ChatOpenAI
 from app.agents.graph.graph_builder import build_graph
 from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
 from app.agents.state import AgentState
-from app.utils.sql_executor import SQLExecutorTool
-from app.agents.tools.distribution_plotter import DistributionPlotTool
-from app.agents.tools.trend_plotter import TrendPlotTool
-from app.agents.tools.summary_stats import SummaryStatsTool
 from typing import Optional
 from dotenv import load_dotenv
 load_dotenv()
 import os
+import threading
+import httpx
 
-class DataAgent:
-    def __init__(self, csv_path: str, file_id: str = None):
-        self.csv_path = csv_path
-        self.file_id = file_id
-        self.loader = CSVToDuckDBLoader(file_id= self.file_id)
-        self.loader.load_csv(csv_path)
+# "two_step" routes first and extracts arguments in the tool node; "single_call" asks for {tool, args} at once
+AGENT_GRAPH_MODE = os.getenv("AGENT_GRAPH_MODE", "two_step")
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-70b-8192")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# One LLM client and compiled graph per worker process, created after the fork so sockets are not shared
+_llm: Optional[ChatOpenAI] = None
+_graphs = {}
+_runtime_lock = threading.Lock()
+
+
+def build_llm() -> ChatOpenAI:
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+        timeout=LLM_TIMEOUT,
+    )
+    return ChatOpenAI(
+        temperature=0,
+        model=LLM_MODEL,
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_API_BASE"),
+        http_client=http_client,
+    )
+
+
+def get_llm() -> ChatOpenAI:
+    global _llm
+    with _runtime_lock:
+        if _llm is None:
+            _llm = build_llm()
+        return _llm
 
-        self.tools = [
-            SQLExecutorTool(duckdb_loader=self.loader),
-            DistributionPlotTool(duckdb_loader=self.loader),
-            TrendPlotTool(duckdb_loader=self.loader),
-            SummaryStatsTool(duckdb_loader=self.loader)
-        ]
 
-        self.llm= ChatOpenAI(
-            temperature=0,
-            model="llama3-70b-8192",
-            openai_api_key=os.getenv("OPENAI_API_KEY"),
-            openai_api_base=os.getenv("OPENAI_API_BASE")
-        )
+def get_agent_graph(mode: str = AGENT_GRAPH_MODE):
+    llm = get_llm()
+    with _runtime_lock:
+        if mode not in _graphs:
+            _graphs[mode] = build_graph(llm, mode=mode)
+            print(f"[AGENT] Compiled {mode} graph for pid {os.getpid()}")
+        return _graphs[mode]
 
-        self.graph = build_graph(self.llm, self.loader)
 
+def init_agent_runtime():
+    # Called from worker_process_init; later tasks only look up the cached client and graph
+    get_agent_graph()
 
-    def run(self, question: str, file_id: Optional[str] = None):
+
+class DataAgent:
+    def __init__(self, csv_path: Optional[str] = None, file_id: str = None, loader: Optional[CSVToDuckDBLoader] = None):
+        self.csv_path = csv_path
+        self.file_id = file_id
+        if loader is None:
+            loader = CSVToDuckDBLoader(file_id= self.file_id)
+            loader.load_csv(csv_path)
+        self.loader = loader
+        self.graph = get_agent_graph()
+
+
+    def run(self, question: str, file_id: Optional[str] = None, task_id: Optional[str] = None):
         input_state: AgentState = {
             "question": question,
             "file_id": file_id,
+            "task_id": task_id,
+            "loader": self.loader,
             "tool_to_use": None,
+            "tool_input": None,
             "answer": None,
+            "failed": False,
+            "uploads": [],
         }
 
+        # Returns the final state without the loader: "answer" plus the "failed" flag callers check before caching
         final_state = self.graph.invoke(input_state)
-        print("Final State:", final_state)
-        return final_state["answer"]
-    
+        result = {k: v for k, v in final_state.items() if k != "loader"}
+        print("Final State:", result)
+        return result
+
@@ -2,6 +2,7 @@ from langgraph.graph import StateGraph
 from langchain_core.language_models import BaseChatModel
 from app.agents.state import AgentState
 from app.agents.graph.nodes.tool_selector import build_tool_selector_node
+from app.agents.graph.nodes.combined_router import build_combined_router_node
 from app.utils.sql_executor import SQLExecutorTool
 from app.agents.tools.distribution_plotter import DistributionPlotTool
 from app.agents.tools.trend_plotter import TrendPlotTool
@@ -9,144 +10,158 @@ from app.agents.tools.summary_stats import SummaryStatsTool
 from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.exceptions import OutputParserException
+from langchain_core.tools import ToolException
 from app.agents.graph.parsers.trend_input_parser import TrendPlotInput
 from app.agents.tools.distribution_plotter import DistributionPlotInput
 from app.agents.tools.summary_stats import SummaryStatsInput
-from app.agents.graph.parsers.trend_input_parser import build_trend_input_parser
-from app.agents.graph.parsers.sql_input_parser import sql_input_parser
-from app.agents.graph.parsers.distributor_input_parser import build_distributor_input_parser
-from app.agents.graph.parsers.stats_input_parser import build_stats_input_parser
+from app.agents.graph.parsers.parser_cache import get_parser_chain
+from app.task_events import publish_task_event
+from app.tracing import span
 
 
-def build_graph(llm: BaseChatModel, duckdb_loader: CSVToDuckDBLoader):
-    sql_tool = SQLExecutorTool(duckdb_loader=duckdb_loader)
-    distribution_tool = DistributionPlotTool(duckdb_loader=duckdb_loader)
-    trend_tool = TrendPlotTool(duckdb_loader=duckdb_loader)
-    summary_stats_tool = SummaryStatsTool(duckdb_loader=duckdb_loader)
+def parse_tool_args(state: AgentState, parser_chain) -> dict:
+    # In single-call mode the router has already extracted and validated the arguments
+    if state.get("tool_input"):
+        return dict(state["tool_input"])
+    with span("parser_llm"):
+        parsed = parser_chain.invoke({"question": state["question"]})
+    publish_task_event(state.get("task_id"), "args_parsed", {"tool": state.get("tool_to_use"), "args": parsed})
+    return parsed
+
+
+def fail(state: AgentState, message: str) -> AgentState:
+    # The message is still the user's answer, but a failed answer is never cached
+    state["answer"] = message
+    state["failed"] = True
+    return state
+
+
+def build_graph(llm: BaseChatModel, mode: str = "two_step"):
+    # The compiled graph is shared by every task in the worker; the dataset arrives in state["loader"]
 
     def sql_node(state: AgentState):
         print("SQL Executor running...")
-        loader = sql_tool.duckdb_loader
+        loader: CSVToDuckDBLoader = state["loader"]
+        sql_tool = SQLExecutorTool(duckdb_loader=loader)
 
-        try:
-            columns_df = loader.conn.execute("PRAGMA table_info('data')").fetchdf()
-            column_names = columns_df["name"].tolist()
-        except Exception as e:
-            state["answer"] = f"Failed to fetch columns: {str(e)}"
-            return state
+        if loader.schema is None:
+            return fail(state, "Failed to fetch columns: dataset schema not loaded")
         
-        parse_chain = sql_input_parser(llm, column_names)
+        parse_chain = get_parser_chain("sql_executor", llm, loader)
 
         try:
-            parsed = parse_chain.invoke({"question": state["question"]})
+            parsed = parse_tool_args(state, parse_chain)
 
             if not parsed.get("query", "").lower().strip().startswith("select"):
-                state["answer"] = f"Invalid SQL generated: {parsed.get('query')}"
-                return state
+                return fail(state, f"Invalid SQL generated: {parsed.get('query')}")
             parsed["file_id"] = state["file_id"]
             print("Parsed input:", parsed)
             validated_input = sql_tool.args_schema(**parsed)
             result = sql_tool.invoke(validated_input.dict())
+            publish_task_event(state.get("task_id"), "query_done", {"tool": "sql_executor"})
 
             state["answer"] = result
             return state
         except OutputParserException as e:
-            state["answer"] = f"Failed to parse SQL input: {str(e)}"
-            return state
+            return fail(state, f"Failed to parse SQL input: {str(e)}")
+        except ToolException as e:
+            return fail(state, str(e))
         
 
     def dist_node(state: AgentState):
         print("Distribution Plot running...")
-        loader = distribution_tool.duckdb_loader
+        loader: CSVToDuckDBLoader = state["loader"]
+        distribution_tool = DistributionPlotTool(duckdb_loader=loader)
 
-        try:
-            columns_df = loader.conn.execute("PRAGMA table_info('data')").fetchdf()
-            column_names = columns_df["name"].tolist()
-        except Exception as e:
-            state["answer"] = f"Failed to fetch columns: {str(e)}"
-            return state
+        if loader.schema is None:
+            return fail(state, "Failed to fetch columns: dataset schema not loaded")
+        column_names = loader.schema.names
         
-        parser_chain = build_distributor_input_parser(llm, column_names)
+        parser_chain = get_parser_chain("distribution_plot", llm, loader)
         try:
-            parsed = parser_chain.invoke({"question": state["question"]})
+            parsed = parse_tool_args(state, parser_chain)
             print("Parsed input for distribution plot:", parsed)
 
             column = parsed.get("column")
             if column not in column_names:
-                state["answer"] = f"Invalid column selected: {column}"
-                return state
+                return fail(state, f"Invalid column selected: {column}")
             parsed["file_id"] = state["file_id"]
 
             validated_input = DistributionPlotInput(**parsed)
             result = distribution_tool.invoke(validated_input.dict())
+            if distribution_tool.pending_upload is not None:
+                state["uploads"] = state.get("uploads", []) + [distribution_tool.pending_upload]
+            publish_task_event(state.get("task_id"), "plot_uploaded", {"tool": "distribution_plot"})
 
             state["answer"] = result
             return state
         
         except OutputParserException as e:
-            state["answer"] = f"Failed to parse distribution input: {str(e)}"
-            return state
+            return fail(state, f"Failed to parse distribution input: {str(e)}")
+        except ToolException as e:
+            return fail(state, str(e))
 
     def trend_node(state: AgentState):
-        loader = trend_tool.duckdb_loader
+        loader: CSVToDuckDBLoader = state["loader"]
+        trend_tool = TrendPlotTool(duckdb_loader=loader)
 
-        try:
-            columns_df = loader.conn.execute("PRAGMA table_info('data')").fetchdf()
-            column_names = columns_df["name"].tolist()
-        except Exception as e:
-            state["answer"] = f"Failed to fetch columns: {str(e)}"
-            return state
+        if loader.schema is None:
+            return fail(state, "Failed to fetch columns: dataset schema not loaded")
 
-        parser_chain = build_trend_input_parser(llm, column_names)
+        parser_chain = get_parser_chain("trend_plot", llm, loader)
 
         try:
-            parsed = parser_chain.invoke({"question": state["question"]})
+            parsed = parse_tool_args(state, parser_chain)
             parsed["file_id"] = state["file_id"]
 
             validated_input = TrendPlotInput(**parsed)
             result = trend_tool.invoke(validated_input.dict())
+            if trend_tool.pending_upload is not None:
+                state["uploads"] = state.get("uploads", []) + [trend_tool.pending_upload]
+            publish_task_event(state.get("task_id"), "plot_uploaded", {"tool": "trend_plot"})
 
             state["answer"] = result
             return state
 
+        except ToolException as e:
+            return fail(state, str(e))
         except Exception as e:
-            state["answer"] = f"Trend plot failed: {str(e)}"
-            return state     
+            return fail(state, f"Trend plot failed: {str(e)}")     
 
     def summary_node(state: AgentState):
         print("Summary Stats running...")
-        loader = summary_stats_tool.duckdb_loader
+        loader: CSVToDuckDBLoader = state["loader"]
+        summary_stats_tool = SummaryStatsTool(duckdb_loader=loader)
 
-        try:
-            columns_df = loader.conn.execute("PRAGMA table_info('data')").fetchdf()
-            column_names = columns_df["name"].tolist()
-        except Exception as e:
-            state["answer"] = f"Failed to fetch columns: {str(e)}"
-            return state
+        if loader.schema is None:
+            return fail(state, "Failed to fetch columns: dataset schema not loaded")
 
-        parser_chain = build_stats_input_parser(llm, column_names)
+        parser_chain = get_parser_chain("summary_stats", llm, loader)
 
         try:
-            parsed = parser_chain.invoke({"question": state["question"]})
+            parsed = parse_tool_args(state, parser_chain)
             print("Parsed summary input:", parsed)
 
             # Graceful validation
             if not parsed.get("columns"):
-                state["answer"] = "No columns selected for summary stats."
-                return state
+                return fail(state, "No columns selected for summary stats.")
 
             parsed["file_id"] = state["file_id"]
             validated_input = SummaryStatsInput(**parsed)
             result = summary_stats_tool.invoke(validated_input.dict())
+            publish_task_event(state.get("task_id"), "query_done", {"tool": "summary_stats"})
 
             state["answer"] = result
             return state
 
         except OutputParserException as e:
-            state["answer"] = f"Failed to parse summary input: {str(e)}"
-            return state
+            return fail(state, f"Failed to parse summary input: {str(e)}")
+        except ToolException as e:
+            return fail(state, str(e))
         
     tool_selector_node = build_tool_selector_node(llm)
+    if mode == "single_call":
+        tool_selector_node = build_combined_router_node(llm, fallback_node=tool_selector_node)
 
     builder = StateGraph(AgentState)
     builder.add_node("tool_selector", tool_selector_node)
@@ -0,0 +1,63 @@
+from langchain_core.runnables import Runnable
+from langchain_core.language_models import BaseChatModel
+from langchain_core.exceptions import OutputParserException
+from pydantic import ValidationError
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+from app.agents.graph.parsers.parser_cache import get_parser_chain
+from app.task_events import publish_task_event
+from app.tracing import span
+from app.utils.sql_executor import SQLQueryInput
+from app.agents.tools.distribution_plotter import DistributionPlotInput
+from app.agents.tools.trend_plotter import TrendPlotInput
+from app.agents.tools.summary_stats import SummaryStatsInput
+
+from typing import Dict
+
+TOOL_INPUT_SCHEMAS = {
+    "sql_executor": SQLQueryInput,
+    "distribution_plot": DistributionPlotInput,
+    "trend_plot": TrendPlotInput,
+    "summary_stats": SummaryStatsInput,
+}
+
+
+def _referenced_columns(tool: str, args: dict) -> list:
+    if tool == "distribution_plot":
+        return [args["column"]]
+    if tool == "trend_plot":
+        return [args["y"]] + ([args["x"]] if args.get("x") else [])
+    if tool == "summary_stats":
+        return list(args.get("columns") or [])
+    return []
+
+
+def build_combined_router_node(llm: BaseChatModel, fallback_node) -> Runnable:
+    # One LLM call returns {tool, args}; anything that fails validation goes through the two-step path instead
+
+    def combined_router_node(state: Dict) -> Dict:
+        duckdb_loader: CSVToDuckDBLoader = state["loader"]
+        chain = get_parser_chain("combined", llm, duckdb_loader)
+        try:
+            with span("router_llm"):
+                parsed = chain.invoke({"question": state["question"]})
+            tool_name = str(parsed.get("tool", "")).strip().lower()
+            schema = TOOL_INPUT_SCHEMAS[tool_name]
+
+            args = {**(parsed.get("args") or {}), "file_id": state["file_id"]}
+            validated = schema(**args).dict()
+
+            unknown = [c for c in _referenced_columns(tool_name, validated) if c not in duckdb_loader.schema.names]
+            if unknown:
+                raise ValueError(f"unknown columns {unknown}")
+            if tool_name == "summary_stats" and not validated.get("columns"):
+                raise ValueError("no columns selected")
+        except (OutputParserException, ValidationError, KeyError, ValueError, AttributeError, TypeError) as e:
+            print(f"🧭 Single-call routing failed ({e}), falling back to two-step routing")
+            return fallback_node({**state, "tool_input": None})
+
+        print("🧭 Tool and arguments selected in one call:", tool_name, validated)
+        publish_task_event(state.get("task_id"), "routed", {"tool": tool_name, "router": "single_call"})
+        publish_task_event(state.get("task_id"), "args_parsed", {"tool": tool_name, "args": validated})
+        return {**state, "tool_to_use": tool_name, "tool_input": validated}
+
+    return combined_router_node
@@ -0,0 +1,81 @@
+import os
+import re
+import threading
+from typing import Optional, Tuple
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from dotenv import load_dotenv
+load_dotenv()
+
+FAST_ROUTER_ENABLED = os.getenv("FAST_ROUTER_ENABLED", "true").lower() == "true"
+FAST_ROUTER_THRESHOLD = float(os.getenv("FAST_ROUTER_THRESHOLD", "0.85"))
+
+# A question is routed by rule only when the rules point at exactly one tool
+ROUTING_RULES = [
+    ("distribution_plot", re.compile(r"\b(distribution|distributed|histogram|spread of|frequency of)\b")),
+    ("trend_plot", re.compile(r"\b(over time|trends?|time series|timeline|over the (years|months|weeks)|(daily|weekly|monthly|yearly))\b|\bplot\b.*\bover\b")),
+    ("summary_stats", re.compile(r"\b(average|mean|median|std|standard deviation|variance|summary|summari[sz]e|statistics|stats|quartiles?)\b")),
+    ("sql_executor", re.compile(r"\b(select|top \d+|how many|number of|count of|list( all)?|which|group by|per|for each|where)\b")),
+]
+
+# Seed questions for the fallback classifier when the rules are ambiguous or silent
+TRAINING_QUESTIONS = {
+    "distribution_plot": [
+        "show distribution of profit", "histogram of sales", "how is discount distributed",
+        "plot the spread of quantity", "what does the distribution of shipping cost look like",
+        "frequency of order values", "show me a histogram for price",
+    ],
+    "trend_plot": [
+        "plot sales over time", "trend of profit by order date", "how did revenue change over the years",
+        "monthly sales trend", "show quantity over time", "plot profit against sales",
+        "weekly orders trend", "line chart of sales by date",
+    ],
+    "summary_stats": [
+        "average discount", "summary of quantity and shipping cost", "mean and median of sales",
+        "what is the standard deviation of profit", "give me statistics for price",
+        "min and max of quantity", "describe the discount column", "summarize sales and profit",
+    ],
+    "sql_executor": [
+        "how many orders are there", "top 5 customers by sales", "list all regions",
+        "which product has the highest profit", "total sales per category",
+        "count of orders by ship mode", "show rows where profit is negative",
+        "number of unique customers in each state",
+    ],
+}
+
+
+class FastRouter:
+    def __init__(self, threshold: float = FAST_ROUTER_THRESHOLD):
+        self.threshold = threshold
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _classifier(self):
+        with self._lock:
+            if self._model is None:
+                questions, labels = [], []
+                for tool, examples in TRAINING_QUESTIONS.items():
+                    questions += examples
+                    labels += [tool] * len(examples)
+                model = make_pipeline(TfidfVectorizer(ngram_range=(1, 2)), LogisticRegression(C=10, max_iter=1000))
+                model.fit(questions, labels)
+                self._model = model
+        return self._model
+
+    def route(self, question: str) -> Tuple[Optional[str], float, str]:
+        text = question.lower()
+        matched = {tool for tool, pattern in ROUTING_RULES if pattern.search(text)}
+        if len(matched) == 1:
+            return matched.pop(), 1.0, "rules"
+
+        model = self._classifier()
+        probabilities = model.predict_proba([text])[0]
+        best = probabilities.argmax()
+        tool, confidence = str(model.classes_[best]), float(probabilities[best])
+        if confidence >= self.threshold and (not matched or tool in matched):
+            return tool, confidence, "classifier"
+        return None, confidence, "classifier"
+
+
+fast_router = FastRouter()
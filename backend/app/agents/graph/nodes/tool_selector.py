@@ -1,6 +1,11 @@
 from langchain_core.runnables import Runnable
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.language_models import BaseChatModel
+from app.agents.graph.nodes.fast_router import fast_router, FAST_ROUTER_ENABLED
+from app.redis_utils import record_router_decision
+from app.task_events import publish_task_event
+from app.tracing import record_span
+import time
 
 from typing import Dict
 
@@ -23,6 +28,18 @@ def build_tool_selector_node(llm: BaseChatModel) -> Runnable:
 
     def tool_selector_node(state: Dict) -> Dict:
         question = state["question"]
+        start = time.perf_counter()
+
+        if FAST_ROUTER_ENABLED:
+            tool_name, confidence, source = fast_router.route(question)
+            if tool_name:
+                print(f"🧭 Tool selected by fast path ({source}, {confidence:.2f}):", tool_name)
+                record_router_decision("fast_path", (time.perf_counter() - start) * 1000)
+                record_span("router_fast", time.perf_counter() - start)
+                publish_task_event(state.get("task_id"), "routed", {"tool": tool_name, "router": source})
+                return {**state, "tool_to_use": tool_name}
+
+        llm_start = time.perf_counter()  # router_llm covers the LLM call only, not the fast-path attempt before it
         tool_name = chain.invoke({"question": question, "chat_history": []})
 
         # Just in case it's a Message object (older versions)
@@ -32,6 +49,9 @@ def build_tool_selector_node(llm: BaseChatModel) -> Runnable:
         tool_name = tool_name.strip().lower()
 
         print("🧭 Tool selected by LLM:", tool_name)  # Optional debug
+        record_router_decision("llm", (time.perf_counter() - start) * 1000)
+        record_span("router_llm", time.perf_counter() - llm_start)
+        publish_task_event(state.get("task_id"), "routed", {"tool": tool_name, "router": "llm"})
 
         return {**state, "tool_to_use": tool_name}
 
@@ -0,0 +1,50 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+from typing import Dict, Optional
+from app.agents.tools.schema_profile import SchemaProfile, describe_tables
+
+
+def build_combined_prompt(column_names: list[str], column_hints: Optional[str] = None,
+                          tables: Optional[Dict[str, SchemaProfile]] = None) -> ChatPromptTemplate:
+    column_list_str = ", ".join(column_names)
+    hints_str = f"Column types and cardinality: {column_hints}.\n" if column_hints else ""
+    if tables:
+        # Plots and summary stats read `data`; only SQL can join the other tables of the session
+        dataset_str = (
+            "The tables, with their column types and cardinality, are:\n"
+            f"{describe_tables(tables)}\n"
+            f"The table `data` is the same as `{next(iter(tables))}`; plots and summary stats use its columns.\n"
+        )
+        sql_str = "a SELECT statement over the tables above, joining them when the question spans several"
+    else:
+        dataset_str = (
+            "The table name is: `data`.\n"
+            f"The column names in the dataset are: {column_list_str}.\n"
+            f"{hints_str}"
+        )
+        sql_str = "a SELECT statement over `data`"
+
+    return ChatPromptTemplate.from_messages([
+        ("system", (
+            "You are a tool selector and argument extractor for a CSV analysis agent.\n"
+            f"{dataset_str}"
+            "Choose exactly one tool and extract its arguments:\n"
+            f"- 'sql_executor': args {{{{'query': {sql_str}}}}}\n"
+            "- 'distribution_plot': args {{'column': numeric column, 'bins': optional int, 'binning': optional 'fixed' | 'fd' | 'quantile', 'image_format': optional 'png' | 'webp' | 'svg'}}\n"
+            "- 'trend_plot': args {{'y': numeric column, 'x': optional column, 'bucket': optional 'day' | 'week' | 'month' | 'quarter' | 'year', 'image_format': optional 'png' | 'webp' | 'svg'}}\n"
+            "- 'summary_stats': args {{'columns': list of columns, 'metrics': optional list of mean, median, min, max, std, p25, p75, count, nulls}}\n\n"
+            "Do not invent or hallucinate column or table names.\n"
+            "Respond ONLY as a JSON object with keys 'tool' and 'args'. Do not include any explanation."
+        )),
+        ("human", "{question}")
+    ])
+
+
+def build_combined_input_parser(llm: BaseChatModel, column_names: list[str], column_hints: Optional[str] = None,
+                                prompt: Optional[ChatPromptTemplate] = None) -> Runnable:
+    prompt = prompt or build_combined_prompt(column_names, column_hints)
+
+    parser = JsonOutputParser()
+    return prompt | llm | parser
@@ -2,20 +2,32 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import Runnable
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from typing import Optional
 
 
-def build_distributor_input_parser(llm: BaseChatModel, column_names: list[str]) -> Runnable:
+def build_distributor_prompt(column_names: list[str], column_hints: Optional[str] = None) -> ChatPromptTemplate:
     column_names =  ", ".join(column_names)
-    prompt = ChatPromptTemplate.from_messages([
+    hints_str = f"Column types and cardinality: {column_hints}.\n" if column_hints else ""
+
+    return ChatPromptTemplate.from_messages([
         ("system", (
             "You are a helpful assistant that extracts structured arguments for distribution plots.\n"
             f"The column names in the dataset are: {column_names}.\n"
+            f"{hints_str}"
             "Based on the user's input, extract:\n"
-            "- 'column': the column to plot (required)\n\n"
-            "Respond ONLY as a JSON object with key: 'column'. Do not include any explanation."
+            "- 'column': the column to plot (required)\n"
+            "- 'bins': number of histogram bins, only if the user asks for one (optional)\n"
+            "- 'binning': 'fixed', 'fd' (Freedman-Diaconis) or 'quantile', only if the user asks for a binning rule (optional)\n"
+            "- 'image_format': 'png', 'webp' or 'svg', only if the user asks for an image format (optional)\n\n"
+            "Respond ONLY as a JSON object with key: 'column' and, if present, 'bins', 'binning' and 'image_format'. Do not include any explanation."
         )),
         ("human", "{question}")
     ])
 
+
+def build_distributor_input_parser(llm: BaseChatModel, column_names: list[str], column_hints: Optional[str] = None,
+                                   prompt: Optional[ChatPromptTemplate] = None) -> Runnable:
+    prompt = prompt or build_distributor_prompt(column_names, column_hints)
+
     parser = JsonOutputParser()
-    return prompt | llm | parser
\ No newline at end of file
+    return prompt | llm | parser
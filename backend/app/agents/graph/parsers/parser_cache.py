@@ -0,0 +1,40 @@
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+from app.agents.graph.parsers.sql_input_parser import build_sql_prompt, sql_input_parser
+from app.agents.graph.parsers.distributor_input_parser import build_distributor_prompt, build_distributor_input_parser
+from app.agents.graph.parsers.trend_input_parser import build_trend_prompt, build_trend_input_parser
+from app.agents.graph.parsers.stats_input_parser import build_stats_prompt, build_stats_input_parser
+from app.agents.graph.parsers.combined_input_parser import build_combined_prompt, build_combined_input_parser
+
+PARSER_BUILDERS = {
+    "sql_executor": (build_sql_prompt, sql_input_parser),
+    "distribution_plot": (build_distributor_prompt, build_distributor_input_parser),
+    "trend_plot": (build_trend_prompt, build_trend_input_parser),
+    "summary_stats": (build_stats_prompt, build_stats_input_parser),
+    "combined": (build_combined_prompt, build_combined_input_parser),
+}
+
+# Parsers whose prompt lists every table of a multi-file session; the others only see `data`
+MULTI_TABLE_PARSERS = {"sql_executor", "combined"}
+
+
+def get_parser_chain(tool: str, llm: BaseChatModel, loader: CSVToDuckDBLoader) -> Runnable:
+    # Prompts and chains live on the loader, so they are memoized per (file_id, tool) and dropped with the dataset
+    build_prompt, build_chain = PARSER_BUILDERS[tool]
+
+    cached = loader.parser_chains.get(tool)
+    if cached and cached[0] is llm:
+        return cached[1]
+
+    prompt = loader.prompts.get(tool)
+    if prompt is None:
+        if loader.table_schemas and tool in MULTI_TABLE_PARSERS:
+            prompt = build_prompt(loader.schema.names, loader.schema.type_hints(), tables=loader.table_schemas)
+        else:
+            prompt = build_prompt(loader.schema.names, loader.schema.type_hints())
+        loader.prompts[tool] = prompt
+
+    chain = build_chain(llm, loader.schema.names, prompt=prompt)
+    loader.parser_chains[tool] = (llm, chain)
+    return chain
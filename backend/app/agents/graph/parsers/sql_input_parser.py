@@ -2,15 +2,22 @@ from langchain_core.language_models import BaseChatModel
 from langchain_core.runnables import Runnable
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+from typing import Dict, Optional
+from app.agents.tools.schema_profile import SchemaProfile, describe_tables
 
-def sql_input_parser(llm: BaseChatModel, column_names: list[str]) -> Runnable:
+def build_sql_prompt(column_names: list[str], column_hints: Optional[str] = None,
+                     tables: Optional[Dict[str, SchemaProfile]] = None) -> ChatPromptTemplate:
+    if tables:
+        return build_session_sql_prompt(tables)
     column_list_str = ", ".join(column_names)
+    hints_str = f"Column types and cardinality: {column_hints}.\n" if column_hints else ""
 
-    prompt = ChatPromptTemplate.from_messages([
+    return ChatPromptTemplate.from_messages([
         ("system", (
             "You are a helpful assistant that extracts structured arguments for SQL queries.\n"
             "The table name is: `data`.\n"
             f"The column names in the dataset are: {column_list_str}.\n"
+            f"{hints_str}"
             "Based on the user's input, extract:\n"
             "- 'query': the SQL query to execute (required)\n\n"
             "Use only the table name `data` in the query.\n"
@@ -20,6 +27,27 @@ def sql_input_parser(llm: BaseChatModel, column_names: list[str]) -> Runnable:
         ("human", "{question}")
     ])
 
+def build_session_sql_prompt(tables: Dict[str, SchemaProfile]) -> ChatPromptTemplate:
+    # Several uploads in one DuckDB connection; joins run in the database, so the model may use any of them
+    return ChatPromptTemplate.from_messages([
+        ("system", (
+            "You are a helpful assistant that extracts structured arguments for SQL queries.\n"
+            "The tables, with their column types and cardinality, are:\n"
+            f"{describe_tables(tables)}\n"
+            f"The table `data` is the same as `{next(iter(tables))}`.\n"
+            "Based on the user's input, extract:\n"
+            "- 'query': the SQL query to execute (required)\n\n"
+            "When the question spans several tables, JOIN them on their matching columns in the query.\n"
+            "Use only the table names listed above.\n"
+            "Do not invent or hallucinate column or table names.\n"
+            "Respond ONLY as a JSON object with key: 'query'."
+        )),
+        ("human", "{question}")
+    ])
+
+def sql_input_parser(llm: BaseChatModel, column_names: list[str], column_hints: Optional[str] = None,
+                     prompt: Optional[ChatPromptTemplate] = None) -> Runnable:
+    prompt = prompt or build_sql_prompt(column_names, column_hints)
 
     parser = JsonOutputParser()  
-    return prompt | llm | parser
\ No newline at end of file
+    return prompt | llm | parser
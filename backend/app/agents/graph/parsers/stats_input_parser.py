@@ -6,14 +6,16 @@ from typing import Dict, List, Optional
 from pydantic import BaseModel
 
 
-def build_stats_input_parser(llm: BaseChatModel, column_names: list[str]) -> Runnable:
+def build_stats_prompt(column_names: list[str], column_hints: Optional[str] = None) -> ChatPromptTemplate:
     column_list_str = ", ".join(column_names)
+    hints_str = f"Column types and cardinality: {column_hints}.\n" if column_hints else ""
 
-    prompt = ChatPromptTemplate.from_messages([
+    return ChatPromptTemplate.from_messages([
         ("system", (
             "You are a helpful assistant that extracts structured inputs for computing summary statistics on a dataset.\n"
             f"The available columns are: {column_list_str}.\n"
-            "Supported metrics include: mean, median, min, max, std (standard deviation).\n"
+            f"{hints_str}"
+            "Supported metrics include: mean, median, min, max, std (standard deviation), p25, p75 (quartiles), count, nulls (missing values).\n"
             "Given a question, extract:\n"
             "- 'columns': list of relevant columns (required)\n"
             "- 'metrics': list of metrics to compute (optional)\n\n"
@@ -22,5 +24,10 @@ def build_stats_input_parser(llm: BaseChatModel, column_names: list[str]) -> Run
         ("human", "{question}")
     ])
 
+
+def build_stats_input_parser(llm: BaseChatModel, column_names: list[str], column_hints: Optional[str] = None,
+                             prompt: Optional[ChatPromptTemplate] = None) -> Runnable:
+    prompt = prompt or build_stats_prompt(column_names, column_hints)
+
     parser = JsonOutputParser()
-    return prompt | llm | parser
\ No newline at end of file
+    return prompt | llm | parser
@@ -4,22 +4,32 @@ from langchain_core.output_parsers import PydanticOutputParser
 from app.agents.tools.trend_plotter import TrendPlotInput
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
+from typing import Optional
 
 
-def build_trend_input_parser(llm: BaseChatModel, column_names: list[str]) -> Runnable:
+def build_trend_prompt(column_names: list[str], column_hints: Optional[str] = None) -> ChatPromptTemplate:
     column_list_str = ", ".join(column_names)
+    hints_str = f"Column types and cardinality: {column_hints}.\n" if column_hints else ""
 
-    prompt = ChatPromptTemplate.from_messages([
+    return ChatPromptTemplate.from_messages([
         ("system", (
             "You are a helpful assistant that extracts structured arguments for plotting trends in tabular data.\n"
             f"The column names in the dataset are: {column_list_str}.\n"
+            f"{hints_str}"
             "Based on the user's input, extract:\n"
             "- 'y': the column to plot on the Y-axis (required)\n"
-            "- 'x': the column to plot on the X-axis (optional)\n\n"
-            "Respond ONLY as a JSON object with keys: 'y' and 'x'. Do not include any explanation."
+            "- 'x': the column to plot on the X-axis (optional)\n"
+            "- 'bucket': time granularity if the user asks for one: 'day', 'week', 'month', 'quarter' or 'year' (optional)\n"
+            "- 'image_format': 'png', 'webp' or 'svg', only if the user asks for an image format (optional)\n\n"
+            "Respond ONLY as a JSON object with keys: 'y', 'x', 'bucket' and 'image_format'. Do not include any explanation."
         )),
         ("human", "{question}")
     ])
 
+
+def build_trend_input_parser(llm: BaseChatModel, column_names: list[str], column_hints: Optional[str] = None,
+                             prompt: Optional[ChatPromptTemplate] = None) -> Runnable:
+    prompt = prompt or build_trend_prompt(column_names, column_hints)
+
     parser = JsonOutputParser()  # Get plain dict
-    return prompt | llm | parser
\ No newline at end of file
+    return prompt | llm | parser
@@ -1,10 +1,14 @@
-from typing import Optional, TypedDict
+from typing import Any, Optional, TypedDict
 
 class AgentState(TypedDict, total=False):
     file_id: str                       
+    task_id: Optional[str]
+    loader: Any                        # CSVToDuckDBLoader for this task's dataset
     question: str                     
     tool_to_use: Optional[str]     
     tool_input: Optional[dict]        
     intermediate_steps: list        
     answer: Optional[str]       
+    failed: bool                       # answer is an error message and must not be cached
+    uploads: list                      # futures of plot uploads the answer's URLs point to
 
@@ -1,20 +1,28 @@
-from typing import Optional, Type, ClassVar
+from typing import Any, Optional, Type, ClassVar, List
 from pydantic import BaseModel
 from langchain.tools import BaseTool
+from langchain_core.tools import ToolException
 import matplotlib.pyplot as plt
-import os
-from uuid import uuid4
-from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+import math
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader, quote_identifier, is_numeric_type
 import matplotlib
-matplotlib.use('Agg') 
-import pandas as pd
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from app.utils.plot_uploader import upload_plot_to_s3
+from app.utils.plot_uploader import put_plot_to_s3, presign_s3_key, plot_lock, plot_format
+from app.tool_cache import get_cached_tool_result, cache_tool_result
+from app.tracing import traced
+
+DEFAULT_BINS = 30
+MAX_BINS = 200
+BINNING_METHODS = ("fixed", "fd", "quantile")
 
 
 class DistributionPlotInput(BaseModel):
     column: str
     file_id: str
+    bins: Optional[int] = DEFAULT_BINS
+    binning: Optional[str] = "fixed"  # fixed | fd (Freedman-Diaconis) | quantile
+    image_format: Optional[str] = None  # png | webp | svg, PLOT_FORMAT when empty
 
 
 class DistributionPlotTool(BaseTool):
@@ -23,41 +31,126 @@ class DistributionPlotTool(BaseTool):
     args_schema: ClassVar[Type[BaseModel]] = DistributionPlotInput
 
     duckdb_loader: Optional[CSVToDuckDBLoader] = None
+    pending_upload: Optional[Any] = None  # Future of the background S3 upload behind the returned URL
 
-    def _run(self, column: str , file_id: str) -> str:
+    def _run(self, column: str , file_id: str, bins: Optional[int] = DEFAULT_BINS, binning: Optional[str] = "fixed",
+             image_format: Optional[str] = None) -> str:
         if not self.duckdb_loader or self.duckdb_loader.conn is None:
-            return "DuckDB not initialized."
+            raise ToolException("DuckDB not initialized.")
 
         try:
-            df = self.duckdb_loader.conn.execute("SELECT * FROM data").fetchdf()
-
-            if column not in df.columns:
-                return f"Column '{column}' not found in the data"
-            
-            if not pd.api.types.is_numeric_dtype(df[column]):
-                return f"Column '{column}' is not numeric and cannot be plotted as a distribution."
-
-            plt.figure(figsize=(12, 6))
-            plt.style.use("ggplot")
-
-            plt.hist(df[column].dropna(), bins=30, color='blue', alpha=0.7)
-            plt.xlabel(column)
-            plt.ylabel("Frequency")
-            plt.title(f"Distribution of {column}", fontsize=14)
-            plt.tight_layout()
-            plt.grid(True)
-
-            fig = plt.gcf()
-            s3_url = upload_plot_to_s3(fig, file_id, prefix="dist_plots")
-            plt.close(fig)
-
-            if s3_url:
-                return s3_url
+            column_types = self.duckdb_loader.column_types()
+
+            if column not in column_types:
+                raise ToolException(f"Column '{column}' not found in the data")
+
+            if not is_numeric_type(column_types[column]):
+                raise ToolException(f"Column '{column}' is not numeric and cannot be plotted as a distribution.")
+
+            bins = min(max(int(bins or DEFAULT_BINS), 1), MAX_BINS)
+            binning = binning if binning in BINNING_METHODS else "fixed"
+
+            image_format = plot_format(image_format)
+            cache_args = {"column": column, "bins": bins, "binning": binning, "image_format": image_format}
+            cached = get_cached_tool_result(self.duckdb_loader.fingerprint, self.name, cache_args)
+            if cached:
+                return presign_s3_key(cached["s3_key"])
+
+            edges, counts = self._profile_histogram(column, bins, binning) or self._histogram(quote_identifier(column), bins, binning)
+            if not counts:
+                raise ToolException(f"Column '{column}' has no values to plot.")
+
+            with plot_lock:
+                plt.figure(figsize=(12, 6))
+                plt.style.use("ggplot")
+
+                # Only the bin arrays reach matplotlib; weights turn one point per bin into the precomputed counts
+                plt.hist(edges[:-1], bins=edges, weights=counts, color='blue', alpha=0.7)
+                plt.xlabel(column)
+                plt.ylabel("Frequency")
+                plt.title(f"Distribution of {column}", fontsize=14)
+                plt.tight_layout()
+                plt.grid(True)
+
+                fig = plt.gcf()
+                # Cache the key only once the object exists, so a failed upload is not served later
+                s3_key, self.pending_upload = put_plot_to_s3(
+                    fig, file_id, prefix="dist_plots", fmt=image_format,
+                    on_uploaded=lambda key: cache_tool_result(
+                        self.duckdb_loader.fingerprint, self.name, cache_args, {"s3_key": key}
+                    ),
+                )
+                plt.close(fig)
+
+            if s3_key:
+                return presign_s3_key(s3_key)
             else:
-                return "Plot generated but failed to upload to S3."
-        
+                raise ToolException("Plot generated but failed to upload to S3.")
+
+        except ToolException:
+            raise
         except Exception as e:
-            return f"Error generating distribution plot: {str(e)}"
-        
+            raise ToolException(f"Error generating distribution plot: {str(e)}")
+
+    def _profile_histogram(self, column: str, bins: int, binning: str):
+        # The upload-time profile holds the default fixed-width histogram of every numeric column
+        profile = self.duckdb_loader.profile
+        if profile is None or binning != "fixed" or bins != profile.histogram_bins:
+            return None
+        stats = profile.column(column)
+        if stats is None or stats.histogram is None:
+            return None
+        print(f"[PROFILE] Histogram of {column} answered from the dataset profile")
+        return stats.histogram.edges, stats.histogram.counts
+
+    @traced("duckdb_query")
+    def _histogram(self, col: str, bins: int, binning: str):
+        conn = self.duckdb_loader.conn
+        lo, hi, n, q1, q3 = conn.execute(
+            f"SELECT min({col})::DOUBLE, max({col})::DOUBLE, count({col}), "
+            f"approx_quantile({col}, 0.25)::DOUBLE, approx_quantile({col}, 0.75)::DOUBLE FROM data"
+        ).fetchone()
+        if not n:
+            return [], []
+        if lo == hi:
+            return [lo - 0.5, hi + 0.5], [n]
+
+        if binning == "quantile":
+            probs = [i / bins for i in range(bins + 1)]
+            quantiles = conn.execute(f"SELECT approx_quantile({col}::DOUBLE, ?::FLOAT[]) FROM data", [probs]).fetchone()[0]
+            edges = sorted(set([lo] + [float(q) for q in quantiles] + [hi]))
+            if len(edges) == 2:
+                return edges, [n]
+            return edges, self._counts_for_edges(col, edges)
+
+        if binning == "fd" and q3 > q1:
+            width = 2 * (q3 - q1) / (n ** (1 / 3))
+            bins = min(max(math.ceil((hi - lo) / width), 1), MAX_BINS)
+
+        width = (hi - lo) / bins
+        rows = conn.execute(
+            f"SELECT least(floor(({col} - ?) / ?), ?)::INTEGER AS bin, count(*) FROM data "
+            f"WHERE {col} IS NOT NULL GROUP BY bin",
+            [lo, width, bins - 1]
+        ).fetchall()
+        counts = [0] * bins
+        for b, c in rows:
+            counts[b] = c
+        edges = [lo + i * width for i in range(bins)] + [hi]
+        return edges, counts
+
+    def _counts_for_edges(self, col: str, edges: List[float]):
+        # Same convention as numpy: half-open bins, with the last bin closed on the right
+        cases = " ".join(f"WHEN {col} < ? THEN {i}" for i in range(len(edges) - 2))
+        rows = self.duckdb_loader.conn.execute(
+            f"SELECT CASE {cases} ELSE {len(edges) - 2} END AS bin, count(*) FROM data "
+            f"WHERE {col} IS NOT NULL GROUP BY bin",
+            edges[1:-1]
+        ).fetchall()
+        counts = [0] * (len(edges) - 1)
+        for b, c in rows:
+            counts[b] = c
+        return counts
+
     def _arun(self, *args, **kwargs):
         raise NotImplementedError("Async not supported for this tool.")
@@ -1,12 +1,113 @@
 import duckdb
 import pandas as pd
+import os
+import resource
+import threading
+import time
+from app.agents.tools.schema_profile import profile_schema, quote_identifier, is_numeric_type
+from app.tracing import record_span
+from dotenv import load_dotenv
+load_dotenv()
+
+# "duckdb" uses DuckDB's parallel CSV reader, "pandas" keeps the old read_csv round-trip for comparison
+INGEST_ENGINE = os.getenv("DUCKDB_INGEST_ENGINE", "duckdb")
+
+PARQUET_EXTENSIONS = (".parquet", ".parq")
+
+
+def _peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
 
 class CSVToDuckDBLoader:
-    def __init__(self, file_id: str = None):
+    def __init__(self, file_id: str = None, engine: str = None):
         self.conn = None
         self.file_id = file_id
+        self.fingerprint = file_id
+        self.engine = engine or INGEST_ENGINE
+        self.load_stats = {}
+        self.schema = None
+        self.profile = None  # DatasetProfile computed at upload time, when available
+        self.version = 0  # appended chunks applied on top of the uploaded file
+        self.table_schemas = {}  # every table the SQL prompt may use, for multi-file sessions
+        self.prompts = {}
+        self.parser_chains = {}
+
+    @property
+    def conn(self):
+        # A DuckDB connection must not be shared between threads; other threads get their own cursor on the same database
+        if self._conn is None or threading.get_ident() == self._owner_thread:
+            return self._conn
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._local.cursor = self._conn.cursor()
+        return cursor
+
+    @conn.setter
+    def conn(self, value):
+        self._conn = value
+        self._owner_thread = threading.get_ident()
+        self._local = threading.local()
+
+    def load_file(self, path: str):
+        if path.lower().endswith(PARQUET_EXTENSIONS):
+            self.load_parquet(path)
+        else:
+            self.load_csv(path)
 
     def load_csv(self, csv_path: str):
+        start = time.perf_counter()
+        rss_before = _peak_rss_mb()
+
+        if self.engine == "pandas":
+            self._load_csv_pandas(csv_path)
+        else:
+            self._load_csv_native(csv_path)
+
+        self._record_load_stats(self.engine, start, rss_before)
+
+    def load_parquet(self, parquet_path: str):
+        start = time.perf_counter()
+        rss_before = _peak_rss_mb()
+        try:
+            self.conn = duckdb.connect()
+            self.conn.execute("CREATE TABLE data AS SELECT * FROM read_parquet(?)", [parquet_path])
+        except Exception as e:
+            raise Exception(f"DuckDB failed to load Parquet: {e}")
+        self._record_load_stats("parquet", start, rss_before)
+
+    def _load_csv_native(self, csv_path: str):
+        try:
+            self.conn = duckdb.connect()
+            self._create_table_from_csv("data", csv_path)
+        except Exception as e:
+            raise Exception(f"DuckDB failed to read CSV: {e}")
+
+    def _create_table_from_csv(self, table: str, csv_path: str):
+        # Compressed inputs (.gz, .zst) are detected from the extension by read_csv
+        table = quote_identifier(table)
+        self.conn.execute(
+            f"CREATE TABLE {table} AS SELECT * FROM read_csv(?, encoding = 'utf-8', store_rejects = true)",
+            [csv_path]
+        )
+        rejects = dict(self.conn.execute(
+            "SELECT error_type::VARCHAR, count(*) FROM reject_errors GROUP BY 1"
+        ).fetchall())
+        self.conn.execute("DROP TABLE reject_errors")
+        self.conn.execute("DROP TABLE reject_scans")
+
+        # A UTF-8 read drops every line with non-UTF-8 bytes, so retry the whole file as latin1
+        if rejects.get("INVALID ENCODING"):
+            print(f"[LOAD] {csv_path} is not UTF-8, reloading as latin1")
+            self.conn.execute(f"DROP TABLE {table}")
+            self.conn.execute(
+                f"CREATE TABLE {table} AS SELECT * FROM read_csv(?, encoding = 'latin-1', ignore_errors = true)",
+                [csv_path]
+            )
+        elif rejects:
+            print(f"[LOAD] Skipped malformed lines in {csv_path}: {rejects}")
+
+    def _load_csv_pandas(self, csv_path: str):
         try:
             df = pd.read_csv(csv_path, encoding="latin1", on_bad_lines="skip")  # Handles malformed lines
         except Exception as e:
@@ -16,13 +117,159 @@ class CSVToDuckDBLoader:
             self.conn = duckdb.connect()
             self.conn.register("df_view", df)  # Create in-memory view
             self.conn.execute("CREATE TABLE data AS SELECT * FROM df_view")
+            self.conn.unregister("df_view")
         except Exception as e:
             raise Exception(f"DuckDB failed to load DataFrame: {e}")
 
+    def _record_load_stats(self, engine: str, start: float, rss_before: float):
+        # Profiled once per load; graph nodes and tools read column names and types from here
+        self.schema = profile_schema(self.conn)
+        self.profile = None
+        self.prompts = {}
+        self.parser_chains = {}
+        self.load_stats = {
+            "engine": engine,
+            "rows": self.schema.row_count,
+            "load_seconds": round(time.perf_counter() - start, 3),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "peak_rss_growth_mb": round(_peak_rss_mb() - rss_before, 1),
+        }
+        record_span("dataset_load", self.load_stats["load_seconds"])
+        print(f"[LOAD] {self.file_id}: {self.load_stats}")
+
+    def export_parquet(self, parquet_path: str):
+        if not self.conn:
+            raise Exception("DuckDB connection not initialized")
+        self.conn.execute("COPY data TO ? (FORMAT PARQUET, COMPRESSION ZSTD)", [parquet_path])
+
+    def append_parquet(self, parquet_path: str):
+        # Appended chunks are stored as Parquet parts and replayed on top of the base file at load time
+        self.conn.execute("INSERT INTO data BY NAME SELECT * FROM read_parquet(?)", [parquet_path])
+        self.version += 1
+
+    def stage_chunk(self, csv_path: str) -> int:
+        # Reads an appended CSV into the "chunk" table with the dataset's column types; a chunk that does not
+        # match the schema is rejected whole
+        types = self.column_types()
+        self.drop_chunk()
+        encoding = "utf-8"
+        try:
+            self.conn.execute("CREATE TEMP TABLE chunk_raw AS SELECT * FROM read_csv(?, header = true, all_varchar = true)", [csv_path])
+        except duckdb.InvalidInputException:
+            encoding = "latin-1"
+            self.conn.execute(
+                "CREATE TEMP TABLE chunk_raw AS SELECT * FROM read_csv(?, header = true, all_varchar = true, encoding = 'latin-1')",
+                [csv_path]
+            )
+        try:
+            names = [r[0] for r in self.conn.execute("SELECT name FROM pragma_table_info('chunk_raw')").fetchall()]
+            missing = [c for c in types if c not in names]
+            unexpected = [c for c in names if c not in types]
+            if missing or unexpected:
+                raise ValueError(f"Chunk columns do not match the dataset: missing {missing}, unexpected {unexpected}")
+
+            # Read again with the dataset's types rather than casting the text: the reader sniffs date and
+            # timestamp formats such as MM/DD/YYYY, as it did for the upload, where CAST only accepts ISO dates
+            columns = ", ".join(quote_identifier(c) for c in types)
+            try:
+                self.conn.execute(
+                    f"CREATE TEMP TABLE chunk AS SELECT {columns} FROM read_csv(?, header = true, encoding = ?, column_types = ?)",
+                    [csv_path, encoding, types]
+                )
+            except duckdb.Error as e:
+                raise ValueError(f"Chunk values do not match the dataset's column types: {e}")
+        finally:
+            self.conn.execute("DROP TABLE IF EXISTS chunk_raw")
+        return self.conn.execute("SELECT count(*) FROM chunk").fetchone()[0]
+
+    def export_chunk(self, parquet_path: str):
+        self.conn.execute("COPY chunk TO ? (FORMAT PARQUET, COMPRESSION ZSTD)", [parquet_path])
+
+    def insert_chunk(self):
+        self.conn.execute("INSERT INTO data BY NAME SELECT * FROM chunk")
+        self.version += 1
+
+    def drop_chunk(self):
+        self.conn.execute("DROP TABLE IF EXISTS chunk_raw")
+        self.conn.execute("DROP TABLE IF EXISTS chunk")
+
+    def refresh_schema(self):
+        # Row counts and column hints changed; prompts built from the old schema are dropped
+        if self.profile is not None and self.profile.version == self.version:
+            self.schema = self.profile.schema_profile()
+        else:
+            self.schema = profile_schema(self.conn)
+        self.prompts = {}
+        self.parser_chains = {}
+
+    def source_versions(self) -> dict:
+        # Appended chunks applied per uploaded file; the pool reloads when a file has moved past them
+        return {self.file_id: self.version}
+
+    def column_types(self) -> dict:
+        if not self.conn:
+            raise Exception("DuckDB connection not initialized")
+        if self.schema is None:
+            self.schema = profile_schema(self.conn)
+        return self.schema.types
+
     def query(self, query: str):
         if not self.conn:
             raise Exception("DuckDB connection not initialized")
         return self.conn.execute(query).fetchdf()
 
+    def memory_usage(self) -> int:
+        if not self.conn:
+            return 0
+        try:
+            return int(self.conn.execute("SELECT sum(memory_usage_bytes) FROM duckdb_memory()").fetchone()[0] or 0)
+        except Exception:
+            return 0
+
+    def close(self):
+        if self._conn:
+            self._conn.close()
+            self.conn = None
+
     def get_file_id(self):
         return self.file_id
+
+
+class SessionLoader(CSVToDuckDBLoader):
+    # Several uploads attached as named tables of one connection, so joins between them run inside DuckDB.
+    # The first table is stored as `data`, with a view under its session name: the single-table tools, which also
+    # rely on rowid order, keep working on it and store artifacts under its file.
+    def __init__(self, session_id: str, tables: dict, engine: str = None):
+        super().__init__(file_id=next(iter(tables.values())), engine=engine)
+        self.session_id = session_id
+        self.tables = tables  # table name -> file_id
+        self.versions = {}
+
+    def load_tables(self, sources: dict):
+        # sources maps each table name to its base file (Parquet artifact or CSV) followed by its appended parts
+        start = time.perf_counter()
+        rss_before = _peak_rss_mb()
+        try:
+            self.conn = duckdb.connect()
+            primary = next(iter(self.tables))
+            for name, (base_path, *part_paths) in sources.items():
+                table = "data" if name == primary else name
+                if base_path.lower().endswith(PARQUET_EXTENSIONS):
+                    self.conn.execute(f"CREATE TABLE {quote_identifier(table)} AS SELECT * FROM read_parquet(?)", [base_path])
+                else:
+                    self._create_table_from_csv(table, base_path)
+                for part_path in part_paths:
+                    self.conn.execute(f"INSERT INTO {quote_identifier(table)} BY NAME SELECT * FROM read_parquet(?)", [part_path])
+                self.versions[self.tables[name]] = len(part_paths)
+            self.conn.execute(f"CREATE VIEW {quote_identifier(primary)} AS SELECT * FROM data")
+        except Exception as e:
+            raise Exception(f"DuckDB failed to load session {self.session_id}: {e}")
+        self._record_load_stats("session", start, rss_before)
+
+        primary = next(iter(self.tables))
+        self.table_schemas = {
+            name: self.schema if name == primary else profile_schema(self.conn, name) for name in self.tables
+        }
+
+    def source_versions(self) -> dict:
+        return dict(self.versions)
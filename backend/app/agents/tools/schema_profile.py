@@ -0,0 +1,324 @@
+import base64
+import math
+import numbers
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+NUMERIC_TYPE_PREFIXES = (
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT",
+    "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT", "UHUGEINT",
+    "FLOAT", "DOUBLE", "REAL", "DECIMAL",
+)
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_numeric_type(duckdb_type: str) -> bool:
+    return duckdb_type.upper().startswith(NUMERIC_TYPE_PREFIXES)
+
+
+class ColumnProfile(BaseModel):
+    name: str
+    type: str
+    null_ratio: float
+    distinct_estimate: int
+
+
+class SchemaProfile(BaseModel):
+    row_count: int
+    columns: List[ColumnProfile]
+
+    @property
+    def names(self) -> List[str]:
+        return [c.name for c in self.columns]
+
+    @property
+    def types(self) -> Dict[str, str]:
+        return {c.name: c.type for c in self.columns}
+
+    def type_hints(self) -> str:
+        hints = []
+        for c in self.columns:
+            details = [c.type, f"~{c.distinct_estimate} distinct"]
+            if c.null_ratio:
+                details.append(f"{c.null_ratio:.0%} null")
+            hints.append(f"{c.name} ({', '.join(details)})")
+        return "; ".join(hints)
+
+
+def profile_schema(conn, table: str = "data") -> SchemaProfile:
+    columns = conn.execute("SELECT name, type FROM pragma_table_info(?)", [table]).fetchall()
+
+    # One scan for every column: non-null counts and HyperLogLog distinct estimates
+    select_exprs = ["count(*)"]
+    for name, _ in columns:
+        col = quote_identifier(name)
+        select_exprs += [f"count({col})", f"approx_count_distinct({col})"]
+    row = conn.execute(f"SELECT {', '.join(select_exprs)} FROM {quote_identifier(table)}").fetchone()
+
+    row_count = row[0]
+    profiles = []
+    for i, (name, col_type) in enumerate(columns):
+        non_null, distinct = row[1 + 2 * i], row[2 + 2 * i]
+        profiles.append(ColumnProfile(
+            name=name,
+            type=col_type,
+            null_ratio=round(1 - non_null / row_count, 4) if row_count else 0.0,
+            distinct_estimate=distinct,
+        ))
+    return SchemaProfile(row_count=row_count, columns=profiles)
+
+
+def describe_tables(tables: Dict[str, SchemaProfile]) -> str:
+    # One line per table of a multi-file session, for the prompts that may join them
+    return "\n".join(f"- `{name}` ({schema.row_count} rows): {schema.type_hints()}" for name, schema in tables.items())
+
+
+# Full per-column statistics, computed once after upload so common questions skip the scan. Every field can be
+# merged with the profile of an appended chunk: counts add, moments combine, HyperLogLog registers take the max.
+PROFILE_QUANTILES = {"p1": 0.01, "p5": 0.05, "p25": 0.25, "p50": 0.5, "p75": 0.75, "p95": 0.95, "p99": 0.99}
+PROFILE_HISTOGRAM_BINS = 30
+HLL_PRECISION = 10  # 1024 registers, ~3% standard error
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+
+class ColumnHistogram(BaseModel):
+    edges: List[float]
+    counts: List[int]
+
+
+class ColumnStats(BaseModel):
+    name: str
+    type: str
+    count: int
+    nulls: int
+    distinct_estimate: int
+    hll: str = ""  # base64 HyperLogLog registers behind distinct_estimate
+    min: Optional[Any] = None
+    max: Optional[Any] = None
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    quantiles: Dict[str, float] = {}
+    histogram: Optional[ColumnHistogram] = None
+
+
+class DatasetProfile(BaseModel):
+    row_count: int
+    version: int = 0  # number of appended chunks included
+    histogram_bins: int
+    columns: List[ColumnStats]
+
+    def column(self, name: str) -> Optional[ColumnStats]:
+        return next((c for c in self.columns if c.name == name), None)
+
+    def schema_profile(self) -> SchemaProfile:
+        return SchemaProfile(row_count=self.row_count, columns=[
+            ColumnProfile(
+                name=c.name,
+                type=c.type,
+                null_ratio=round(c.nulls / self.row_count, 4) if self.row_count else 0.0,
+                distinct_estimate=c.distinct_estimate,
+            )
+            for c in self.columns
+        ])
+
+
+def _json_value(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, numbers.Number):  # DECIMAL columns come back as Decimal
+        return float(value)
+    return str(value)
+
+
+def hll_estimate(registers: bytes) -> int:
+    m = len(registers)
+    raw = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in registers)
+    zeros = registers.count(0)
+    if raw <= 2.5 * m and zeros:
+        return round(m * math.log(m / zeros))  # linear counting for small cardinalities
+    return round(raw)
+
+
+def _hll_sketches(conn, table: str, names: List[str]) -> Dict[str, bytes]:
+    # One scan for every column: the top bits of the 64-bit hash pick the register, the rest give the rank
+    if not names:
+        return {}
+    rest = 64 - HLL_PRECISION
+    hashes = ", ".join(
+        f"CASE WHEN {quote_identifier(n)} IS NULL THEN NULL ELSE hash({quote_identifier(n)}) END" for n in names
+    )
+    rows = conn.execute(
+        f"SELECT k, h >> {rest} AS register, "
+        f"max(CASE WHEN h & {(1 << rest) - 1} = 0 THEN {rest + 1} "
+        f"ELSE {rest} - floor(log2((h & {(1 << rest) - 1})::DOUBLE))::INTEGER END) "
+        f"FROM (SELECT unnest(range({len(names)})) AS k, unnest([{hashes}]) AS h FROM {quote_identifier(table)}) "
+        f"WHERE h IS NOT NULL GROUP BY ALL"
+    ).fetchall()
+    registers = {name: bytearray(HLL_REGISTERS) for name in names}
+    for k, register, rank in rows:
+        registers[names[k]][register] = rank
+    return {name: bytes(r) for name, r in registers.items()}
+
+
+def _histograms(conn, table: str, ranges: Dict[str, tuple], bins: int) -> Dict[str, ColumnHistogram]:
+    # Fixed-width bins over the given (lo, hi) of each column, all columns in one scan
+    histograms, exprs, params, names = {}, [], [], []
+    for name, (lo, hi) in ranges.items():
+        if lo == hi:
+            continue
+        col = quote_identifier(name)
+        exprs.append(f"histogram(least(floor(({col} - ?) / ?), ?)::INTEGER) FILTER (WHERE {col} IS NOT NULL)")
+        params += [lo, (hi - lo) / bins, bins - 1]
+        names.append(name)
+    if exprs:
+        row = conn.execute(f"SELECT {', '.join(exprs)} FROM {quote_identifier(table)}", params).fetchone()
+        for name, counts_by_bin in zip(names, row):
+            lo, hi = ranges[name]
+            width = (hi - lo) / bins
+            counts = [0] * bins
+            for b, c in (counts_by_bin or {}).items():
+                counts[b] = c
+            histograms[name] = ColumnHistogram(edges=[lo + i * width for i in range(bins)] + [hi], counts=counts)
+    return histograms
+
+
+def _constant_histogram(value: float, count: int) -> ColumnHistogram:
+    return ColumnHistogram(edges=[value - 0.5, value + 0.5], counts=[count])
+
+
+def profile_dataset(conn, table: str = "data", bins: int = PROFILE_HISTOGRAM_BINS, histograms: bool = True) -> DatasetProfile:
+    columns = conn.execute("SELECT name, type FROM pragma_table_info(?)", [table]).fetchall()
+    quantile_list = "[" + ", ".join(str(q) for q in PROFILE_QUANTILES.values()) + "]"
+
+    # Scan 1: counts, min/max, moments and approximate quantiles for every column
+    select_exprs, slots = ["count(*)"], []
+    for name, col_type in columns:
+        col = quote_identifier(name)
+        exprs = [f"count({col})", f"min({col})", f"max({col})"]
+        if is_numeric_type(col_type):
+            exprs += [f"avg({col})::DOUBLE", f"stddev_samp({col})::DOUBLE", f"approx_quantile({col}::DOUBLE, {quantile_list})"]
+        slots.append((len(select_exprs), len(exprs)))
+        select_exprs += exprs
+    row = conn.execute(f"SELECT {', '.join(select_exprs)} FROM {quote_identifier(table)}").fetchone()
+
+    # Scan 2: HyperLogLog registers, kept so distinct estimates can be merged on append
+    sketches = _hll_sketches(conn, table, [name for name, _ in columns])
+
+    row_count = row[0]
+    stats = []
+    for (name, col_type), (offset, width) in zip(columns, slots):
+        values = row[offset:offset + width]
+        column = ColumnStats(
+            name=name,
+            type=col_type,
+            count=values[0],
+            nulls=row_count - values[0],
+            distinct_estimate=hll_estimate(sketches[name]),
+            hll=base64.b64encode(sketches[name]).decode(),
+            min=_json_value(values[1]),
+            max=_json_value(values[2]),
+        )
+        if width > 3:
+            column.mean, column.std = values[3], values[4]
+            if values[5]:
+                column.quantiles = dict(zip(PROFILE_QUANTILES, (float(q) for q in values[5])))
+        stats.append(column)
+
+    # Scan 3: default histograms for numeric columns; bin edges need the min/max from scan 1
+    if histograms:
+        numeric = [c for c in stats if c.mean is not None and c.count]
+        computed = _histograms(conn, table, {c.name: (float(c.min), float(c.max)) for c in numeric}, bins)
+        for c in numeric:
+            c.histogram = computed.get(c.name) or _constant_histogram(float(c.min), c.count)
+
+    return DatasetProfile(row_count=row_count, histogram_bins=bins, columns=stats)
+
+
+def _histogram_quantiles(histogram: ColumnHistogram) -> Dict[str, float]:
+    # Linear interpolation inside bins; used once a merge has made the scanned quantiles stale
+    total = sum(histogram.counts)
+    if not total:
+        return {}
+    quantiles, seen, b = {}, 0, 0
+    for label, q in PROFILE_QUANTILES.items():
+        target = q * total
+        while b < len(histogram.counts) - 1 and seen + histogram.counts[b] < target:
+            seen += histogram.counts[b]
+            b += 1
+        lo, hi = histogram.edges[b], histogram.edges[b + 1]
+        fraction = (target - seen) / histogram.counts[b] if histogram.counts[b] else 0.0
+        quantiles[label] = lo + min(max(fraction, 0.0), 1.0) * (hi - lo)
+    return quantiles
+
+
+def merge_profiles(base: DatasetProfile, chunk: DatasetProfile, conn, chunk_table: str = "chunk",
+                   table: str = "data") -> DatasetProfile:
+    # chunk is profiled without histograms: its counts are binned on the base edges, or the column is re-binned
+    # over the whole table when the chunk widens its range. Call after the chunk rows were inserted into table.
+    merged, same_range, wider_range = [], {}, {}
+    for a in base.columns:
+        b = chunk.column(a.name)
+        count = a.count + b.count
+        column = ColumnStats(
+            name=a.name,
+            type=a.type,
+            count=count,
+            nulls=a.nulls + b.nulls,
+            distinct_estimate=0,
+            min=min((v for v in (a.min, b.min) if v is not None), default=None),
+            max=max((v for v in (a.max, b.max) if v is not None), default=None),
+        )
+        registers = bytes(max(x, y) for x, y in zip(base64.b64decode(a.hll), base64.b64decode(b.hll)))
+        column.hll = base64.b64encode(registers).decode()
+        column.distinct_estimate = hll_estimate(registers)
+
+        if a.mean is not None or b.mean is not None:
+            if not b.count:
+                column.mean, column.std = a.mean, a.std
+            elif not a.count:
+                column.mean, column.std = b.mean, b.std
+            else:
+                # Chan et al. parallel variance: combine sums of squared deviations around each mean
+                delta = b.mean - a.mean
+                column.mean = a.mean + delta * b.count / count
+                m2 = (a.std or 0.0) ** 2 * (a.count - 1) + (b.std or 0.0) ** 2 * (b.count - 1)
+                m2 += delta ** 2 * a.count * b.count / count
+                column.std = math.sqrt(m2 / (count - 1)) if count > 1 else None
+
+            if count and a.histogram and column.min == a.min and column.max == a.max:
+                same_range[a.name] = column
+            elif count:
+                wider_range[a.name] = column
+        merged.append(column)
+
+    base_by_name = {c.name: c for c in base.columns}
+    if same_range:
+        added = _histograms(conn, chunk_table, {
+            name: (float(base_by_name[name].min), float(base_by_name[name].max)) for name in same_range
+        }, base.histogram_bins)
+        for name, column in same_range.items():
+            previous = base_by_name[name].histogram
+            extra = added.get(name) or _constant_histogram(float(column.min), chunk.column(name).count)
+            column.histogram = ColumnHistogram(
+                edges=previous.edges, counts=[x + y for x, y in zip(previous.counts, extra.counts)]
+            )
+    if wider_range:
+        rebinned = _histograms(conn, table, {
+            name: (float(c.min), float(c.max)) for name, c in wider_range.items()
+        }, base.histogram_bins)
+        for name, column in wider_range.items():
+            column.histogram = rebinned.get(name) or _constant_histogram(float(column.min), column.count)
+
+    for column in merged:
+        if column.histogram:
+            column.quantiles = _histogram_quantiles(column.histogram)
+
+    return DatasetProfile(
+        row_count=base.row_count + chunk.row_count,
+        version=base.version + 1,
+        histogram_bins=base.histogram_bins,
+        columns=merged,
+    )
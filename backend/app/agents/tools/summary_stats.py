@@ -1,9 +1,27 @@
 from typing import ClassVar, Optional, Type, List
 from pydantic import BaseModel
-from langchain_core.tools import BaseTool
+from langchain_core.tools import BaseTool, ToolException
 from app.utils.plot_uploader import store_text_result
-from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+from app.tracing import span
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader, quote_identifier, is_numeric_type
 import json
+import numbers
+
+# Every metric is an aggregate expression so all requested columns are computed in one DuckDB scan
+METRIC_SQL = {
+    "mean": "avg({col})",
+    "std": "stddev_samp({col})",
+    "min": "min({col})",
+    "max": "max({col})",
+    "median": "quantile_cont({col}, 0.5)",
+    "p25": "quantile_cont({col}, 0.25)",
+    "p75": "quantile_cont({col}, 0.75)",
+    "count": "count({col})",
+    "nulls": "count(*) - count({col})",
+}
+NUMERIC_ONLY_METRICS = {"mean", "std", "median", "p25", "p75"}
+# Exact in the upload-time profile; its quantiles are approximate, so median/p25/p75 still query the table
+PROFILE_METRICS = {"mean", "std", "min", "max", "count", "nulls"}
 
 class SummaryStatsInput(BaseModel):
     columns: Optional[List[str]] = None
@@ -19,45 +37,89 @@ class SummaryStatsTool(BaseTool):
 
     def _run(self, columns: Optional[List[str]] = None, metrics: Optional[List[str]] = None, file_id: str = "") -> str:
         if not self.duckdb_loader or self.duckdb_loader.conn is None:
-            return "DuckDB not initialized."
+            raise ToolException("DuckDB not initialized.")
 
-        df = self.duckdb_loader.conn.execute("SELECT * FROM data").fetchdf()
-        missing = [col for col in columns if col not in df.columns]
+        columns = columns or []
+        column_types = self.duckdb_loader.column_types()
+        missing = [col for col in columns if col not in column_types]
         if missing:
-            return f"Invalid columns: {missing}"
+            raise ToolException(f"Invalid columns: {missing}")
 
-        allowed_metrics = {"mean", "std", "min", "max", "median"}
         synonym_map = {
-            "average": "mean", "standard deviation": "std",
-            "minimum": "min", "maximum": "max"
+            "average": "mean", "avg": "mean", "standard deviation": "std", "stddev": "std",
+            "minimum": "min", "maximum": "max",
+            "25th percentile": "p25", "first quartile": "p25",
+            "75th percentile": "p75", "third quartile": "p75",
+            "null": "nulls", "null count": "nulls", "missing": "nulls",
         }
         final_metrics = []
-        for m in metrics:
+        for m in metrics or []:
             norm = synonym_map.get(m.lower(), m.lower())
-            if norm in allowed_metrics:
+            if norm in METRIC_SQL and norm not in final_metrics:
                 final_metrics.append(norm)
 
         if not final_metrics:
             final_metrics = ["mean", "std"]
 
+        computed = self._from_profile(columns, final_metrics, column_types)
+        if computed is None:
+            select_exprs = []
+            slots = []
+            for col in columns:
+                numeric = is_numeric_type(column_types[col])
+                for metric in final_metrics:
+                    if metric in NUMERIC_ONLY_METRICS and not numeric:
+                        continue
+                    select_exprs.append(METRIC_SQL[metric].format(col=quote_identifier(col)))
+                    slots.append((col, metric))
+
+            values = []
+            if select_exprs:
+                try:
+                    with span("duckdb_query"):
+                        values = self.duckdb_loader.conn.execute(f"SELECT {', '.join(select_exprs)} FROM data").fetchone()
+                except Exception as e:
+                    raise ToolException(f"Summary stats failed: {e}")
+            computed = dict(zip(slots, values))
+
         result = {}
         for col in columns:
             result[col] = {}
             for metric in final_metrics:
-                try:
-                    value = getattr(df[col], metric)()
-                    result[col][metric] = round(float(value), 4)
-                except Exception:
+                value = computed.get((col, metric))
+                if value is None:
                     result[col][metric] = "N/A"
-        
+                elif isinstance(value, int):
+                    result[col][metric] = value
+                elif isinstance(value, numbers.Number):
+                    result[col][metric] = round(float(value), 4)
+                else:
+                    result[col][metric] = str(value)
+
         try:
             json_content = json.dumps({"summary_statistics": result}, indent=2)
             store_text_result(file_id, json_content)
         except Exception as e:
-            return f"Summary stats calculated but failed to upload to S3: {e}"
+            raise ToolException(f"Summary stats calculated but failed to upload to S3: {e}")
 
         return f"Summary stats:\n{result}"
 
+    def _from_profile(self, columns: List[str], metrics: List[str], column_types: dict) -> Optional[dict]:
+        profile = self.duckdb_loader.profile
+        if profile is None or not set(metrics) <= PROFILE_METRICS:
+            return None
+        computed = {}
+        for col in columns:
+            stats = profile.column(col)
+            if stats is None:
+                return None
+            numeric = is_numeric_type(column_types[col])
+            for metric in metrics:
+                if metric in NUMERIC_ONLY_METRICS and not numeric:
+                    continue
+                computed[(col, metric)] = getattr(stats, metric)
+        print(f"[PROFILE] Summary stats for {columns} answered from the dataset profile")
+        return computed
+
     def _arun(self, *args, **kwargs):
         raise NotImplementedError("Async not supported.")
-
@@ -1,17 +1,27 @@
-from typing import ClassVar, Optional, Type
+from typing import Any, ClassVar, Optional, Type
 from pydantic import BaseModel
 from langchain.tools import BaseTool
-from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
-from app.utils.plot_uploader import upload_plot_to_s3
+from langchain_core.tools import ToolException
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader, quote_identifier, is_numeric_type
+from app.utils.plot_uploader import put_plot_to_s3, presign_s3_key, plot_lock, plot_format
+from app.tool_cache import get_cached_tool_result, cache_tool_result
+from app.tracing import span, traced
 import matplotlib
-matplotlib.use('Agg')  
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import pandas as pd
+
+# Longer series are reduced to the min and max point of each x bucket, which keeps peaks visible on the plot
+TREND_TARGET_POINTS = 2000
+TREND_MAX_BUCKETS = 260
+TIME_BUCKETS = {"day": 1, "week": 7, "month": 30, "quarter": 91, "year": 365}
+DATE_FORMATS = ["%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d", "%m-%d-%Y", "%d-%m-%Y", "%Y%m%d"]
 
 
 class TrendPlotInput(BaseModel):
     y: str
     x: Optional[str] = None
+    bucket: Optional[str] = None  # day | week | month | quarter | year, chosen from the date span when empty
+    image_format: Optional[str] = None  # png | webp | svg, PLOT_FORMAT when empty
     file_id: str
 
 
@@ -20,64 +30,144 @@ class TrendPlotTool(BaseTool):
     description: ClassVar[str] = "Plot trends in numerical data"
     args_schema: ClassVar[Type[BaseModel]] = TrendPlotInput
     duckdb_loader: Optional[CSVToDuckDBLoader] = None
+    pending_upload: Optional[Any] = None  # Future of the background S3 upload behind the returned URL
 
-    def _run(self, y: str, file_id: str, x: Optional[str] = None) -> str:
+    def _run(self, y: str, file_id: str, x: Optional[str] = None, bucket: Optional[str] = None,
+             image_format: Optional[str] = None) -> str:
         if not self.duckdb_loader or self.duckdb_loader.conn is None:
-            return "DuckDB not initialized."
+            raise ToolException("DuckDB not initialized.")
 
         try:
-            df = self.duckdb_loader.conn.execute("SELECT * FROM data").fetchdf()
+            column_types = self.duckdb_loader.column_types()
 
-            if y not in df.columns:
-                return f"Column '{y}' not found in the data."
-            if x and x not in df.columns:
-                return f"Column '{x}' not found in the data."
+            if y not in column_types:
+                raise ToolException(f"Column '{y}' not found in the data.")
+            if x and x not in column_types:
+                raise ToolException(f"Column '{x}' not found in the data.")
+            if not is_numeric_type(column_types[y]):
+                raise ToolException(f"Column '{y}' is not numeric and cannot be plotted as a trend.")
 
-            plt.figure(figsize=(12, 6))
-            plt.style.use("ggplot")
+            image_format = plot_format(image_format)
+            cache_args = {"y": y, "x": x, "bucket": bucket, "image_format": image_format}
+            cached = get_cached_tool_result(self.duckdb_loader.fingerprint, self.name, cache_args)
+            if cached:
+                return presign_s3_key(cached["s3_key"])
 
             title = f"{y} over {x}" if x else f"{y} Trend (Row-wise)"
+            y_sql = quote_identifier(y)
+            style = "line"
 
+            # Queries run before plot_lock, so threads answering other questions only wait for each other's drawing
             if x:
-                if pd.api.types.is_datetime64_any_dtype(df[x]) or "date" in x.lower():
-                    df[x] = pd.to_datetime(df[x], errors="coerce")
-                    df = df.dropna(subset=[x, y])
-                    df = df.sort_values(x)
-                    df.set_index(x, inplace=True)
-                    df = df.resample("W").sum(numeric_only=True)
-                    plt.plot(df.index, df[y], marker='o', linewidth=2)
-                    plt.xlabel(x)
-
-                elif pd.api.types.is_numeric_dtype(df[x]):
-                    df = df.dropna(subset=[x, y])
-                    df = df.sort_values(x)
-                    plt.plot(df[x], df[y])
-                    plt.xlabel(x)
+                x_sql = quote_identifier(x)
+                x_type = column_types[x].upper()
 
-                else:
-                    df = df.dropna(subset=[x, y])
-                    grouped = df.groupby(x)[y].mean().reset_index()
-                    plt.bar(grouped[x], grouped[y])
-                    plt.xlabel(x)
+                if x_type.startswith(("DATE", "TIMESTAMP")) or "date" in x.lower():
+                    xs, ys, bucket = self._time_buckets(x_sql, x_type, y_sql, bucket)
+                    style, xlabel = "markers", f"{x} ({bucket})"
 
-            else:
-                df = df.dropna(subset=[y])
-                plt.plot(df[y])
-                plt.xlabel("Index")
+                elif is_numeric_type(x_type):
+                    xs, ys = self._downsampled_series(x_sql, y_sql)
+                    xlabel = x
 
-            plt.ylabel(y)
-            plt.title(title, fontsize=14)
-            plt.tight_layout()
-            plt.grid(True)
+                else:
+                    with span("duckdb_query"):
+                        rows = self.duckdb_loader.conn.execute(
+                            f"SELECT {x_sql}, avg({y_sql}) FROM data "
+                            f"WHERE {x_sql} IS NOT NULL AND {y_sql} IS NOT NULL GROUP BY 1 ORDER BY 1"
+                        ).fetchall()
+                    xs, ys = [str(r[0]) for r in rows], [r[1] for r in rows]
+                    style, xlabel = "bar", x
 
-            fig = plt.gcf()
-            s3_url = upload_plot_to_s3(fig, file_id=file_id, prefix="trend_plots")  # ✅ Removed trailing slash
-            plt.close(fig)
+            else:
+                xs, ys = self._downsampled_series("rowid", y_sql)
+                xlabel = "Index"
 
-            return s3_url if s3_url else "Plot generated but failed to upload to S3."
+            with plot_lock:
+                plt.figure(figsize=(12, 6))
+                plt.style.use("ggplot")
 
+                if style == "bar":
+                    plt.bar(xs, ys)
+                elif style == "markers":
+                    plt.plot(xs, ys, marker='o', linewidth=2)
+                else:
+                    plt.plot(xs, ys)
+                plt.xlabel(xlabel)
+                plt.ylabel(y)
+                plt.title(title, fontsize=14)
+                plt.tight_layout()
+                plt.grid(True)
+
+                fig = plt.gcf()
+                s3_key, self.pending_upload = put_plot_to_s3(
+                    fig, file_id=file_id, prefix="trend_plots", fmt=image_format,
+                    on_uploaded=lambda key: cache_tool_result(
+                        self.duckdb_loader.fingerprint, self.name, cache_args, {"s3_key": key}
+                    ),
+                )
+                plt.close(fig)
+
+            if not s3_key:
+                raise ToolException("Plot generated but failed to upload to S3.")
+            return presign_s3_key(s3_key)
+
+        except ToolException:
+            raise
         except Exception as e:
-            return f"Plotting failed: {str(e)}"
+            raise ToolException(f"Plotting failed: {str(e)}")
+
+    @traced("duckdb_query")
+    def _time_buckets(self, x_sql: str, x_type: str, y_sql: str, bucket: Optional[str]):
+        conn = self.duckdb_loader.conn
+        if x_type.startswith(("DATE", "TIMESTAMP")):
+            ts = f"{x_sql}::TIMESTAMP"
+        else:
+            ts = f"coalesce(TRY_CAST({x_sql} AS TIMESTAMP), try_strptime({x_sql}::VARCHAR, {DATE_FORMATS!r}))"
+
+        if bucket not in TIME_BUCKETS:
+            lo, hi = conn.execute(f"SELECT min({ts}), max({ts}) FROM data").fetchone()
+            if lo is None:
+                raise ValueError("no parseable dates in the x column")
+            span_days = (hi - lo).days
+            bucket = next(
+                (b for b, days in TIME_BUCKETS.items() if span_days / days <= TREND_MAX_BUCKETS),
+                "year"
+            )
+
+        rows = conn.execute(
+            f"SELECT date_trunc(?, {ts}) AS bucket, sum({y_sql}) FROM data "
+            f"WHERE {ts} IS NOT NULL AND {y_sql} IS NOT NULL GROUP BY bucket ORDER BY bucket",
+            [bucket]
+        ).fetchall()
+        return [r[0] for r in rows], [r[1] for r in rows], bucket
+
+    @traced("duckdb_query")
+    def _downsampled_series(self, x_sql: str, y_sql: str):
+        conn = self.duckdb_loader.conn
+        not_null = f"{x_sql} IS NOT NULL AND {y_sql} IS NOT NULL"
+        n, lo, hi = conn.execute(
+            f"SELECT count(*), min({x_sql})::DOUBLE, max({x_sql})::DOUBLE FROM data WHERE {not_null}"
+        ).fetchone()
+
+        if n <= TREND_TARGET_POINTS or lo == hi:
+            rows = conn.execute(f"SELECT {x_sql}, {y_sql} FROM data WHERE {not_null} ORDER BY 1").fetchall()
+            return [r[0] for r in rows], [r[1] for r in rows]
+
+        buckets = TREND_TARGET_POINTS // 2
+        rows = conn.execute(
+            f"SELECT least(floor(({x_sql} - ?) / ? * ?), ?)::INTEGER AS b, "
+            f"arg_min({x_sql}, {y_sql}), min({y_sql}), arg_max({x_sql}, {y_sql}), max({y_sql}) "
+            f"FROM data WHERE {not_null} GROUP BY b ORDER BY b",
+            [lo, hi - lo, buckets, buckets - 1]
+        ).fetchall()
+
+        xs, ys = [], []
+        for _, x_at_min, y_min, x_at_max, y_max in rows:
+            for point in sorted([(x_at_min, y_min), (x_at_max, y_max)]):
+                xs.append(point[0])
+                ys.append(point[1])
+        return xs, ys
 
     def _arun(self, *args, **kwargs):
         raise NotImplementedError("Async not supported.")
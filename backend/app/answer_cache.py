@@ -0,0 +1,137 @@
+import os
+import re
+from typing import Optional
+import redis
+from sklearn.feature_extraction.text import HashingVectorizer
+from app.redis_utils import redis_client, async_redis_client
+from dotenv import load_dotenv
+load_dotenv()
+
+# Answers can contain presigned plot URLs (valid for 3600s), so entries must expire before the links do
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", "3000"))
+# Cosine similarity needed to reuse the answer of a differently worded question; 0 disables the lookup
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+PHRASE_SYNONYMS = [
+    (re.compile(r"\bstandard deviation\b"), "std"),
+    (re.compile(r"\bover the time\b|\bover time\b|\bacross time\b"), "over time"),
+    (re.compile(r"\bhow many\b|\bnumber of\b|\bcount of\b"), "count"),
+]
+WORD_SYNONYMS = {
+    "avg": "mean", "average": "mean", "stddev": "std", "minimum": "min", "maximum": "max",
+    "histogram": "distribution", "distributed": "distribution", "spread": "distribution",
+    "trends": "trend",
+    "stats": "statistics", "summarize": "summary", "summarise": "summary",
+}
+FILLER_WORDS = {
+    "a", "an", "the", "of", "for", "me", "please", "can", "could", "you", "what", "whats", "is", "are",
+    "show", "give", "tell", "display", "find", "get", "compute", "calculate", "plot", "draw", "chart", "graph",
+}
+
+# Operators, signs and numbers a similar question must share exactly, e.g. "profit > 0" never matches "profit < 0"
+OPERAND_PATTERN = re.compile(r"[-+*/%<>=!]+|\d+(?:\.\d+)?")
+
+_vectorizer = HashingVectorizer(analyzer="char_wb", ngram_range=(3, 4), n_features=2 ** 16, alternate_sign=False)
+
+
+def normalize_question(question: str) -> str:
+    # Only case, whitespace and trailing punctuation are folded: operators, signs and digits change the answer
+    text = re.sub(r"\s+", " ", question.lower()).strip()
+    text = re.sub(r"[\s?!.]+$", "", text)
+    for pattern, replacement in PHRASE_SYNONYMS:
+        text = pattern.sub(replacement, text)
+    words = [WORD_SYNONYMS.get(w, w) for w in text.split()]
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+
+def dataset_key(file_id: str, file_meta: Optional[dict]) -> str:
+    # Identical uploads share a content fingerprint; fall back to file_id until the worker has computed it
+    if file_meta and file_meta.get("fingerprint"):
+        return file_meta["fingerprint"]
+    return file_id
+
+
+def _record(stat: str):
+    try:
+        redis_client.hincrby("answer_cache:stats", stat, 1)
+    except redis.RedisError:
+        pass
+
+
+def _most_similar(dataset: str, normalized: str) -> Optional[str]:
+    candidates = list(redis_client.smembers(f"answer_index:{dataset}"))
+    return _best_match(normalized, candidates)
+
+
+def _best_match(normalized: str, candidates: list) -> Optional[str]:
+    operands = OPERAND_PATTERN.findall(normalized)
+    candidates = [c for c in candidates if OPERAND_PATTERN.findall(c) == operands]
+    if not candidates:
+        return None
+    vectors = _vectorizer.transform([normalized] + candidates)
+    scores = (vectors[1:] @ vectors[0].T).toarray().ravel()
+    best = scores.argmax()
+    if scores[best] >= ANSWER_CACHE_SIMILARITY:
+        print(f"[CACHE] '{normalized}' matched '{candidates[best]}' ({scores[best]:.2f})")
+        return candidates[best]
+    return None
+
+
+def get_cached_answer(dataset: str, question: str) -> Optional[str]:
+    normalized = normalize_question(question)
+    answer = redis_client.get(f"answer:{dataset}:{normalized}")
+    if answer:
+        _record("hits")
+        return answer
+
+    if ANSWER_CACHE_SIMILARITY > 0:
+        similar = _most_similar(dataset, normalized)
+        answer = redis_client.get(f"answer:{dataset}:{similar}") if similar else None
+        if answer:
+            _record("hits")
+            _record("similar_hits")
+            return answer
+
+    _record("misses")
+    return None
+
+
+async def get_cached_answer_async(dataset: str, question: str) -> Optional[str]:
+    normalized = normalize_question(question)
+    answer = await async_redis_client.get(f"answer:{dataset}:{normalized}")
+    stats = ["hits"] if answer else []
+
+    if not answer and ANSWER_CACHE_SIMILARITY > 0:
+        candidates = list(await async_redis_client.smembers(f"answer_index:{dataset}"))
+        similar = _best_match(normalized, candidates)
+        answer = await async_redis_client.get(f"answer:{dataset}:{similar}") if similar else None
+        stats = ["hits", "similar_hits"] if answer else []
+
+    try:
+        pipe = async_redis_client.pipeline()
+        for stat in stats or ["misses"]:
+            pipe.hincrby("answer_cache:stats", stat, 1)
+        await pipe.execute()
+    except redis.RedisError:
+        pass
+    return answer or None
+
+
+def cache_answer(dataset: str, question: str, answer: str):
+    normalized = normalize_question(question)
+    pipe = redis_client.pipeline()
+    pipe.set(f"answer:{dataset}:{normalized}", answer, ex=ANSWER_CACHE_TTL)
+    if ANSWER_CACHE_SIMILARITY > 0:
+        pipe.sadd(f"answer_index:{dataset}", normalized)
+        pipe.expire(f"answer_index:{dataset}", ANSWER_CACHE_TTL)
+    pipe.execute()
+
+
+def get_answer_cache_stats() -> dict:
+    stats = redis_client.hgetall("answer_cache:stats")
+    return {k: int(v) for k, v in stats.items()}
+
+
+async def get_answer_cache_stats_async() -> dict:
+    stats = await async_redis_client.hgetall("answer_cache:stats")
+    return {k: int(v) for k, v in stats.items()}
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+from typing import Optional
+import redis
+from app.agents.tools.schema_profile import DatasetProfile
+from app.redis_utils import redis_client, async_redis_client
+from app.s3_utils import upload_profile_artifact, read_profile_artifact
+from app.tool_cache import TOOL_CACHE_TTL
+from dotenv import load_dotenv
+load_dotenv()
+
+# S3 holds the durable copy; Redis keeps a hot copy so workers and /profile/ skip the S3 round-trip
+PROFILE_TTL = int(os.getenv("PROFILE_TTL", str(TOOL_CACHE_TTL)))
+
+
+def profile_key(file_id: str) -> str:
+    return f"profile:{file_id}"
+
+
+def save_dataset_profile(file_id: str, profile: DatasetProfile):
+    body = profile.model_dump_json()
+    upload_profile_artifact(file_id, body)
+    try:
+        redis_client.set(profile_key(file_id), body, ex=PROFILE_TTL)
+    except redis.RedisError as e:
+        print(f"[PROFILE] Failed to cache profile for {file_id}: {e}")
+
+
+def _read_profile(file_id: str) -> Optional[str]:
+    try:
+        body = redis_client.get(profile_key(file_id))
+    except redis.RedisError as e:
+        print(f"[PROFILE] Lookup failed: {e}")
+        body = None
+    if body:
+        return body
+
+    body = read_profile_artifact(file_id)
+    if body:
+        try:
+            redis_client.set(profile_key(file_id), body, ex=PROFILE_TTL)
+        except redis.RedisError:
+            pass
+    return body
+
+
+def get_dataset_profile(file_id: str) -> Optional[DatasetProfile]:
+    body = _read_profile(file_id)
+    return DatasetProfile.model_validate_json(body) if body else None
+
+
+async def get_dataset_profile_async(file_id: str) -> Optional[dict]:
+    body = await async_redis_client.get(profile_key(file_id))
+    if not body:
+        body = await asyncio.to_thread(_read_profile, file_id)
+    return json.loads(body) if body else None
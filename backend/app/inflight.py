@@ -0,0 +1,46 @@
+import os
+from typing import Optional
+import redis
+from app.redis_utils import redis_client, async_redis_client
+from app.answer_cache import normalize_question
+from dotenv import load_dotenv
+load_dotenv()
+
+# Upper bound on how long a question stays claimed if its worker dies before releasing it
+INFLIGHT_TTL = int(os.getenv("INFLIGHT_TTL", "300"))
+
+# Delete the claim only if it still belongs to the finishing task
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def inflight_key(dataset: str, question: str) -> str:
+    return f"inflight:{dataset}:{normalize_question(question)}"
+
+
+async def claim_inflight_async(key: str, task_id: str) -> Optional[str]:
+    # Returns the task id already answering this question, or None when task_id now owns it
+    if await async_redis_client.set(key, task_id, nx=True, ex=INFLIGHT_TTL):
+        return None
+    existing = await async_redis_client.get(key)
+    if existing is None:
+        # The owner released between SET and GET; its answer is cached by now, but claiming again is harmless
+        await async_redis_client.set(key, task_id, ex=INFLIGHT_TTL)
+    return existing
+
+
+def release_inflight(key: Optional[str], task_id: str):
+    if not key:
+        return
+    try:
+        redis_client.eval(RELEASE_SCRIPT, 1, key, task_id)
+    except redis.RedisError as e:
+        print(f"[INFLIGHT] Could not release {task_id}: {e}")
+
+
+async def release_inflight_async(key: str, task_id: str):
+    await async_redis_client.eval(RELEASE_SCRIPT, 1, key, task_id)
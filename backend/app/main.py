@@ -1,8 +1,12 @@
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from typing import Dict, Optional
 import uuid
+import json
+import asyncio
 from fastapi import Request
 from slowapi.middleware import SlowAPIMiddleware
 from celery.result import AsyncResult
@@ -11,9 +15,20 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from fastapi import Request
 from slowapi.errors import RateLimitExceeded
 # from slowapi.decorators import limiter
-from app.s3_utils import generate_presigned_url
-from app.redis_utils import save_file_metadata, get_file_metadata, get_cached_answer
-from app.worker.tasks import process_question
+from app.s3_utils import generate_presigned_url_async, generate_presigned_append_url_async, append_chunk_key
+from app.redis_utils import save_file_metadata_async, get_file_metadata_async, get_router_stats_async, async_redis_client, metadata_cache
+from app.task_events import task_events_key, FINAL_STAGES
+from app.answer_cache import get_cached_answer_async, get_answer_cache_stats_async, dataset_key
+from app.worker.tasks import prepare_dataset, append_dataset
+from app.inflight import inflight_key, claim_inflight_async, release_inflight_async
+from app.question_batcher import question_batcher
+from app.worker.affinity import queue_for_file
+from app.sql_results import get_sql_page
+from app.dataset_profiles import get_dataset_profile_async
+from app.tracing import span, render_latency_metrics_async, get_task_trace_async
+from app.sessions import (
+    validate_session_tables, create_session_async, get_session_async, session_ref, session_dataset_key_async,
+)
 
 app = FastAPI()
 
@@ -47,33 +62,62 @@ async def rate_limit_handler(request: Request, exc: RateLimitExceeded):
 
 
 class AskRequest(BaseModel):
-    file_id: str
+    file_id: Optional[str] = None
+    session_id: Optional[str] = None  # ask across every file of a session instead of a single file
     question: str
 
 class UploadRequest(BaseModel):
     filename: str
 
-cache_hits = 0
-cache_misses = 0
+class UploadCompleteRequest(BaseModel):
+    file_id: str
+
+class AppendRequest(BaseModel):
+    file_id: str
+
+class AppendCompleteRequest(BaseModel):
+    file_id: str
+    append_id: str
+
+class SessionRequest(BaseModel):
+    tables: Dict[str, str]  # table name -> file_id; the first table is also queryable as `data`
 
 @app.post("/ask/")
 @limiter.limit("20/minute")  
 async def ask_question(request: Request, data: AskRequest):
-    global cache_hits, cache_misses
-    file_meta = get_file_metadata(data.file_id)
-    if not file_meta:
-        return JSONResponse(status_code=404, content={"error": "File metadata not found"})
-
-    cached = get_cached_answer(data.file_id, data.question)
+    with span("api_cache_lookup"):
+        if data.session_id:
+            # Workers pool, route and batch a session under its ref like a single file
+            dataset_ref = session_ref(data.session_id)
+            dataset = await session_dataset_key_async(data.session_id)
+            if not dataset:
+                return JSONResponse(status_code=404, content={"error": "Session not found"})
+        elif data.file_id:
+            dataset_ref = data.file_id
+            file_meta = await get_file_metadata_async(data.file_id)
+            if not file_meta:
+                return JSONResponse(status_code=404, content={"error": "File metadata not found"})
+            dataset = dataset_key(data.file_id, file_meta)
+        else:
+            return JSONResponse(status_code=400, content={"error": "file_id or session_id is required"})
+        cached = await get_cached_answer_async(dataset, data.question)
     if cached:
-        cache_hits += 1
         return {"answer": cached, "cached": True}
-    else:
-        cache_misses += 1
 
-    print(f"[CACHE] Hits: {cache_hits}, Misses: {cache_misses}")
-    task = process_question.delay(data.file_id, data.question)
-    return {"status": "processing", "task_id": task.id}
+    # Single flight: a duplicate of a question that is still being answered shares that task's result
+    task_id = str(uuid.uuid4())
+    claim_key = inflight_key(dataset, data.question)
+    existing = await claim_inflight_async(claim_key, task_id)
+    if existing:
+        return {"status": "processing", "task_id": existing, "coalesced": True}
+
+    try:
+        with span("api_enqueue", task_id):
+            await question_batcher.submit(dataset_ref, data.question, task_id=task_id, claim_key=claim_key)
+    except Exception:
+        await release_inflight_async(claim_key, task_id)
+        raise
+    return {"status": "processing", "task_id": task_id}
 
 @app.post("/upload/")
 async def get_presigned_url(file: UploadRequest):
@@ -85,10 +129,10 @@ async def get_presigned_url(file: UploadRequest):
 
     try:
         print(f"[backend] Generating presigned URL for: {file.filename}")
-        upload_url, s3_key = generate_presigned_url(user_id, upload_id, file.filename)
+        upload_url, s3_key = await generate_presigned_url_async(user_id, upload_id, file.filename)
         print(f"[backend] S3 Key: {s3_key}")
 
-        save_file_metadata(file_id, file.filename, s3_key, user_id=user_id)
+        await save_file_metadata_async(file_id, file.filename, s3_key, user_id=user_id)
         print("[backend] Metadata saved to Redis")
 
         return {
@@ -101,19 +145,192 @@ async def get_presigned_url(file: UploadRequest):
         print("[backend] ERROR in /upload/:", e)
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/upload_complete/")
+async def upload_complete(data: UploadCompleteRequest):
+    file_meta = await get_file_metadata_async(data.file_id)
+    if not file_meta:
+        return JSONResponse(status_code=404, content={"error": "File metadata not found"})
+
+    # Warm the worker that later questions about this file will be routed to
+    queue = await run_in_threadpool(queue_for_file, data.file_id)
+    task = await run_in_threadpool(prepare_dataset.apply_async, args=(data.file_id,), queue=queue)
+    return {"status": "processing", "task_id": task.id}
+
+@app.post("/append/")
+async def get_presigned_append_url(data: AppendRequest):
+    # Adds rows to an existing file: the client PUTs a CSV chunk with the file's columns, then calls /append_complete/
+    file_meta = await get_file_metadata_async(data.file_id)
+    if not file_meta:
+        return JSONResponse(status_code=404, content={"error": "File metadata not found"})
+
+    append_id = str(uuid.uuid4())
+    upload_url, s3_key = await generate_presigned_append_url_async(file_meta["s3_path"], append_id)
+    return {"upload_url": upload_url, "file_id": data.file_id, "append_id": append_id, "s3_path": s3_key}
+
+@app.post("/append_complete/")
+async def append_complete(data: AppendCompleteRequest):
+    file_meta = await get_file_metadata_async(data.file_id)
+    if not file_meta:
+        return JSONResponse(status_code=404, content={"error": "File metadata not found"})
+    try:
+        append_id = str(uuid.UUID(data.append_id))
+    except ValueError:
+        return JSONResponse(status_code=400, content={"error": "Invalid append_id"})
+
+    # Same worker as the file's questions, so its pooled copy is extended in place
+    queue = await run_in_threadpool(queue_for_file, data.file_id)
+    chunk_key = append_chunk_key(file_meta["s3_path"], append_id)
+    task = await run_in_threadpool(append_dataset.apply_async, args=(data.file_id, chunk_key), queue=queue)
+    return {"status": "processing", "task_id": task.id}
+
+@app.post("/session/")
+async def create_session(data: SessionRequest):
+    # Attaches several uploads as named tables of one DuckDB connection, so questions can join them
+    try:
+        validate_session_tables(data.tables)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    for name, file_id in data.tables.items():
+        if not await get_file_metadata_async(file_id):
+            return JSONResponse(status_code=404, content={"error": f"File metadata not found for table {name}"})
+
+    session_id = await create_session_async(data.tables)
+    # Warm the worker that the session's questions will be routed to
+    ref = session_ref(session_id)
+    queue = await run_in_threadpool(queue_for_file, ref)
+    task = await run_in_threadpool(prepare_dataset.apply_async, args=(ref,), queue=queue)
+    return {"session_id": session_id, "tables": data.tables, "task_id": task.id}
+
+@app.get("/session/{session_id}")
+async def get_session(session_id: str):
+    tables = await get_session_async(session_id)
+    if tables is None:
+        return JSONResponse(status_code=404, content={"error": "Session not found"})
+    return {"session_id": session_id, "tables": tables}
+
 @app.get("/result/{task_id}")
 async def get_result(task_id: str):
-    result = AsyncResult(task_id, app=celery_app)
-    if result.state == "PENDING":
+    # AsyncResult reads the result backend synchronously
+    def read_result():
+        result = AsyncResult(task_id, app=celery_app)
+        return result.state, result.result if result.state == "SUCCESS" else None
+
+    state, answer = await run_in_threadpool(read_result)
+    if state == "PENDING":
         return {"status": "pending"}
-    if result.state == "SUCCESS":
-        return {"status": "done", "answer": result.result}
-    return {"status": result.state}
+    if state == "SUCCESS":
+        return {"status": "done", "answer": answer}
+    return {"status": state}
+
+@app.get("/profile/{file_id}")
+async def dataset_profile(file_id: str):
+    # Written by prepare_dataset once the upload has been loaded
+    if not await get_file_metadata_async(file_id):
+        return JSONResponse(status_code=404, content={"error": "File metadata not found"})
+    profile = await get_dataset_profile_async(file_id)
+    if profile is None:
+        return JSONResponse(status_code=404, content={"error": "Profile not available yet"})
+    return profile
+
+@app.get("/sql_page/{token}")
+async def sql_page(token: str, limit: Optional[int] = None):
+    # Continuation tokens come from SQL answers whose result did not fit in the preview
+    try:
+        page = await run_in_threadpool(get_sql_page, token, limit)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    if page is None:
+        return JSONResponse(status_code=404, content={"error": "SQL result expired or not found"})
+    return page
+
+STREAM_TIMEOUT_SECONDS = 300
+STREAM_KEEPALIVE_SECONDS = 15
+
+@app.get("/stream/{task_id}")
+async def stream_task_events(task_id: str):
+    # Server-Sent Events: replays stages already published by the worker, then follows them live until done
+    key = task_events_key(task_id)
+
+    async def event_stream():
+        pubsub = async_redis_client.pubsub()
+        await pubsub.subscribe(key)
+        last_seq = 0
+        try:
+            for raw in await async_redis_client.lrange(key, 0, -1):
+                event = json.loads(raw)
+                last_seq = event["seq"]
+                yield f"data: {raw}\n\n"
+                if event["stage"] in FINAL_STAGES:
+                    return
+
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + STREAM_TIMEOUT_SECONDS
+            while loop.time() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=STREAM_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event = json.loads(message["data"])
+                if event["seq"] <= last_seq:
+                    continue
+                last_seq = event["seq"]
+                yield f"data: {message['data']}\n\n"
+                if event["stage"] in FINAL_STAGES:
+                    return
+            yield f"data: {json.dumps({'stage': 'timeout'})}\n\n"
+        finally:
+            await pubsub.unsubscribe(key)
+            await pubsub.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 @app.get("/cache_stats/")
 async def get_cache_stats():
+    stats = await get_answer_cache_stats_async()
+    cache_hits = stats.get("hits", 0)
+    cache_misses = stats.get("misses", 0)
     return {
         "cache_hits": cache_hits,
         "cache_misses": cache_misses,
-        "hit_rate": f"{(cache_hits / (cache_hits + cache_misses + 1e-5)):.2%}"
-    }
\ No newline at end of file
+        "similar_hits": stats.get("similar_hits", 0),
+        "hit_rate": f"{(cache_hits / (cache_hits + cache_misses + 1e-5)):.2%}",
+        "metadata_cache": metadata_cache.stats(),
+    }
+
+@app.get("/router_stats/")
+async def router_stats():
+    stats = await get_router_stats_async()
+    fast = int(stats.get("fast_path_count", 0))
+    llm = int(stats.get("llm_count", 0))
+    return {
+        "fast_path_routes": fast,
+        "llm_routes": llm,
+        "llm_calls_saved": fast,
+        "fast_path_rate": f"{(fast / (fast + llm + 1e-5)):.2%}",
+        "avg_fast_path_ms": round(float(stats.get("fast_path_latency_ms", 0)) / fast, 3) if fast else None,
+        "avg_llm_route_ms": round(float(stats.get("llm_latency_ms", 0)) / llm, 3) if llm else None,
+    }
+
+@app.get("/trace/{task_id}")
+async def task_trace(task_id: str):
+    spans = await get_task_trace_async(task_id)
+    return {"task_id": task_id, "spans": spans, "total_ms": round(sum(s["ms"] for s in spans if s["stage"] != "task_total"), 2)}
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape target: stage latency histograms pushed by the API and every worker, plus shared counters
+    lines = [await render_latency_metrics_async()]
+
+    cache = await get_answer_cache_stats_async()
+    lines.append("# HELP datasense_answer_cache_total Answer cache lookups by result")
+    lines.append("# TYPE datasense_answer_cache_total counter")
+    for result in ("hits", "misses", "similar_hits"):
+        lines.append(f'datasense_answer_cache_total{{result="{result}"}} {cache.get(result, 0)}')
+
+    router = await get_router_stats_async()
+    lines.append("# HELP datasense_router_decisions_total Questions routed by the fast path or the LLM")
+    lines.append("# TYPE datasense_router_decisions_total counter")
+    for path in ("fast_path", "llm"):
+        lines.append(f'datasense_router_decisions_total{{path="{path}"}} {int(router.get(f"{path}_count", 0))}')
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, List, Optional
+from app.worker.tasks import process_question, process_question_batch
+from app.worker.affinity import queue_for_file
+from dotenv import load_dotenv
+load_dotenv()
+
+# Questions for the same file arriving within this window are sent to the worker as one batch; 0 disables batching
+ASK_BATCH_WINDOW_MS = int(os.getenv("ASK_BATCH_WINDOW_MS", "25"))
+ASK_BATCH_MAX_SIZE = int(os.getenv("ASK_BATCH_MAX_SIZE", "8"))
+
+
+class QuestionBatcher:
+    def __init__(self, window_ms: int = ASK_BATCH_WINDOW_MS, max_size: int = ASK_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending: Dict[str, List[dict]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+
+    async def submit(self, file_id: str, question: str, task_id: Optional[str] = None, claim_key: Optional[str] = None) -> str:
+        # Task ids are chosen here so a question gets its id before we know whether it will run alone or in a batch
+        item = {
+            "task_id": task_id or str(uuid.uuid4()),
+            "question": question,
+            "claim_key": claim_key,
+            "enqueued_at": time.time(),  # queue wait on the worker includes the batching window
+            "sent": asyncio.get_running_loop().create_future(),
+        }
+        if self.window <= 0:
+            await self._dispatch(file_id, [item])
+            return item["task_id"]
+
+        batch = self._pending.setdefault(file_id, [])
+        batch.append(item)
+        if len(batch) >= self.max_size:
+            self._flush(file_id)
+        elif file_id not in self._timers:
+            self._timers[file_id] = asyncio.get_running_loop().call_later(self.window, self._flush, file_id)
+
+        await item["sent"]
+        return item["task_id"]
+
+    def _flush(self, file_id: str):
+        timer = self._timers.pop(file_id, None)
+        if timer:
+            timer.cancel()
+        batch = self._pending.pop(file_id, [])
+        if batch:
+            asyncio.get_running_loop().create_task(self._dispatch(file_id, batch))
+
+    async def _dispatch(self, file_id: str, batch: List[dict]):
+        try:
+            # Routing and publishing talk to the broker, so keep them off the event loop
+            queue = await asyncio.to_thread(queue_for_file, file_id)
+            if len(batch) == 1:
+                item = batch[0]
+                await asyncio.to_thread(
+                    process_question.apply_async,
+                    args=(file_id, item["question"], item["claim_key"]),
+                    kwargs={"enqueued_at": item["enqueued_at"]},
+                    task_id=item["task_id"],
+                    queue=queue,
+                )
+            else:
+                items = [{k: item[k] for k in ("task_id", "question", "claim_key", "enqueued_at")} for item in batch]
+                await asyncio.to_thread(process_question_batch.apply_async, args=(file_id, items), queue=queue)
+                print(f"[BATCH] Sent {len(items)} questions for {file_id} to {queue} as one task")
+        except Exception as e:
+            for item in batch:
+                if not item["sent"].done():
+                    item["sent"].set_exception(e)
+            return
+        for item in batch:
+            if not item["sent"].done():
+                item["sent"].set_result(None)
+
+
+question_batcher = QuestionBatcher()
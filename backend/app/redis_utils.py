@@ -1,6 +1,10 @@
 import redis
+import redis.asyncio
 import os
 import json
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional
 from datetime import datetime
 from dotenv import load_dotenv
@@ -13,8 +17,124 @@ redis_client = redis.Redis(
     decode_responses=True
 )
 
-def save_file_metadata(file_id: str, filename: str, s3_path: str, user_id: Optional[str] = None):
-    key = f"file:{file_id}"
+# Used by the FastAPI event loop. The blocking pool makes bursts wait for a free connection instead of failing
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "100"))
+async_redis_client = redis.asyncio.Redis(
+    connection_pool=redis.asyncio.BlockingConnectionPool(
+        host=os.getenv("REDIS_HOST"),
+        port=int(os.getenv("REDIS_PORT")),
+        max_connections=REDIS_MAX_CONNECTIONS,
+        decode_responses=True
+    )
+)
+
+# Process-local copy of file:{file_id} hashes. Keyspace notifications drop entries changed elsewhere; the TTL
+# bounds staleness when the server does not publish them. 0 disables the cache.
+METADATA_CACHE_TTL = float(os.getenv("METADATA_CACHE_TTL", "30"))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "10000"))
+KEYSPACE_EVENT_FLAGS = "Kghx"  # keyspace channel; generic (DEL, RENAME), hash and expiry events
+# Notifications are server-wide config, normally set at deployment (redis-server --notify-keyspace-events Kghx).
+# Only with this flag does the app run CONFIG SET itself; managed Redis usually disables CONFIG.
+METADATA_KEYSPACE_CONFIG = os.getenv("METADATA_KEYSPACE_CONFIG", "false").lower() in ("1", "true", "yes")
+
+
+class MetadataCache:
+    def __init__(self, ttl: float = METADATA_CACHE_TTL, max_entries: int = METADATA_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # file_id -> (expires_at, metadata)
+        self._lock = threading.Lock()
+        self._listener_pid = None
+
+    def get(self, file_id: str) -> Optional[dict]:
+        if self.ttl <= 0:
+            return None
+        self._ensure_listener()
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                return dict(entry[1])
+            self._entries.pop(file_id, None)
+            self.misses += 1
+            return None
+
+    def put(self, file_id: str, metadata: dict):
+        if self.ttl <= 0 or not metadata:
+            return
+        with self._lock:
+            self._entries[file_id] = (time.monotonic() + self.ttl, dict(metadata))
+            self._entries.move_to_end(file_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def merge(self, file_id: str, fields: dict):
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry:
+                self._entries[file_id] = (entry[0], {**entry[1], **fields})
+
+    def invalidate(self, file_id: str):
+        with self._lock:
+            if self._entries.pop(file_id, None):
+                self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations}
+
+    def _ensure_listener(self):
+        # Started lazily so every Celery child (forked after import) runs its own listener thread
+        if self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            self._entries.clear()
+        threading.Thread(target=self._listen, name="metadata-invalidation", daemon=True).start()
+
+    def _listen(self):
+        db = redis_client.connection_pool.connection_kwargs.get("db", 0)
+        pattern = f"__keyspace@{db}__:file:*"
+        prefix = pattern[:-1]
+        try:
+            current = redis_client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+            # "A" is the server's alias for every event class
+            if not set(KEYSPACE_EVENT_FLAGS) <= set(current.replace("A", "g$lshzxet")):
+                if not METADATA_KEYSPACE_CONFIG:
+                    print(f"[METADATA] Keyspace notifications are not enabled on the server, "
+                          f"relying on the {self.ttl}s TTL")
+                    return
+                redis_client.config_set("notify-keyspace-events", "".join(sorted(set(current + KEYSPACE_EVENT_FLAGS))))
+        except redis.RedisError as e:
+            # CONFIG is unavailable, so whether events are published is unknown: keep the TTL and listen anyway
+            print(f"[METADATA] Could not check keyspace notifications, relying on the {self.ttl}s TTL "
+                  f"unless they arrive: {e}")
+
+        while True:
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(pattern)
+                for message in pubsub.listen():
+                    if message["type"] == "pmessage":
+                        self.invalidate(message["channel"][len(prefix):])
+            except redis.RedisError as e:
+                print(f"[METADATA] Invalidation listener lost its connection: {e}")
+                # Changes made while disconnected were missed
+                with self._lock:
+                    self._entries.clear()
+                time.sleep(1)
+
+
+metadata_cache = MetadataCache()
+
+def _file_metadata(filename: str, s3_path: str, user_id: Optional[str] = None) -> dict:
     metadata = {
         "filename": filename,
         "s3_path": s3_path,
@@ -22,21 +142,61 @@ def save_file_metadata(file_id: str, filename: str, s3_path: str, user_id: Optio
     }
     if user_id:
         metadata["user_id"] = user_id
+    return metadata
+
+def save_file_metadata(file_id: str, filename: str, s3_path: str, user_id: Optional[str] = None):
+    key = f"file:{file_id}"
+    metadata = _file_metadata(filename, s3_path, user_id)
 
     print(f"[DEBUG] Saving metadata to Redis under key {key}: {metadata}")
     redis_client.hset(key, mapping=metadata)
+    metadata_cache.invalidate(file_id)
 
+async def save_file_metadata_async(file_id: str, filename: str, s3_path: str, user_id: Optional[str] = None):
+    key = f"file:{file_id}"
+    metadata = _file_metadata(filename, s3_path, user_id)
+
+    print(f"[DEBUG] Saving metadata to Redis under key {key}: {metadata}")
+    await async_redis_client.hset(key, mapping=metadata)
+    metadata_cache.invalidate(file_id)
 
-def get_cached_answer(file_id, question):
-    key = f"{file_id}:{question}"
-    val = redis_client.get(key)
-    return val if val else None 
 
-def get_file_metadata(file_id: str):
+def get_file_metadata(file_id: str, use_cache: bool = True):
+    cached = metadata_cache.get(file_id) if use_cache else None
+    if cached:
+        return cached
     key = f"file:{file_id}"
     data = redis_client.hgetall(key)
+    metadata_cache.put(file_id, data)
     return data if data else None
 
-def cache_answer(file_id: str, question: str, answer: str):
-    key = f"answer:{file_id}:{question}"
-    redis_client.set(key, answer)
+async def get_file_metadata_async(file_id: str):
+    cached = metadata_cache.get(file_id)
+    if cached:
+        return cached
+    key = f"file:{file_id}"
+    data = await async_redis_client.hgetall(key)
+    metadata_cache.put(file_id, data)
+    return data if data else None
+
+def update_file_metadata(file_id: str, fields: dict):
+    key = f"file:{file_id}"
+    redis_client.hset(key, mapping=fields)
+    metadata_cache.merge(file_id, fields)
+
+
+def record_router_decision(path: str, latency_ms: float):
+    # path is "fast_path" or "llm"; counters are shared by all workers
+    try:
+        pipe = redis_client.pipeline()
+        pipe.hincrby("router:stats", f"{path}_count", 1)
+        pipe.hincrbyfloat("router:stats", f"{path}_latency_ms", latency_ms)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[ROUTER] Failed to record routing stats: {e}")
+
+def get_router_stats():
+    return redis_client.hgetall("router:stats")
+
+async def get_router_stats_async():
+    return await async_redis_client.hgetall("router:stats")
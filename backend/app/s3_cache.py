@@ -0,0 +1,124 @@
+import fcntl
+import hashlib
+import os
+import posixpath
+import time
+from boto3.s3.transfer import TransferConfig
+from app.tracing import record_span
+from dotenv import load_dotenv
+load_dotenv()
+
+S3_CACHE_DIR = os.getenv("S3_CACHE_DIR", "/tmp/datasense_cache")
+S3_CACHE_MAX_MB = int(os.getenv("S3_CACHE_MAX_MB", "2048"))
+# Objects above one chunk are fetched as parallel ranged GETs
+S3_DOWNLOAD_CHUNK_MB = int(os.getenv("S3_DOWNLOAD_CHUNK_MB", "8"))
+S3_DOWNLOAD_CONCURRENCY = int(os.getenv("S3_DOWNLOAD_CONCURRENCY", "8"))
+# fetch() hands out a path the caller opens later; entries fetched more recently than this are never evicted
+S3_CACHE_EVICT_GRACE_SECONDS = float(os.getenv("S3_CACHE_EVICT_GRACE_SECONDS", "300"))
+
+MB = 1024 * 1024
+
+
+class S3DiskCache:
+    # Files are named after the object's ETag, so a re-uploaded object is fetched again and identical
+    # uploads share one copy. Worker processes coordinate through flock on a per-entry lock file: shared while an
+    # entry is read, exclusive while it is downloaded or evicted. Lock files are never removed, since a process
+    # may be waiting on one.
+    def __init__(self, s3_client, root: str = S3_CACHE_DIR, max_bytes: int = S3_CACHE_MAX_MB * MB):
+        self.s3_client = s3_client
+        self.root = root
+        self.max_bytes = max_bytes
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_DOWNLOAD_CHUNK_MB * MB,
+            multipart_chunksize=S3_DOWNLOAD_CHUNK_MB * MB,
+            max_concurrency=S3_DOWNLOAD_CONCURRENCY,
+        )
+        os.makedirs(root, exist_ok=True)
+
+    def _entry_path(self, etag: str, size: int, key: str) -> str:
+        digest = hashlib.sha256(f"{etag}:{size}".encode()).hexdigest()[:32]
+        # Keep the extension: the loader picks the reader (Parquet, CSV, gzip) from it
+        name = posixpath.basename(key)
+        suffix = ".csv.gz" if name.endswith(".csv.gz") else posixpath.splitext(name)[1]
+        return os.path.join(self.root, digest + suffix)
+
+    def fetch(self, bucket: str, key: str) -> str:
+        head = self.s3_client.head_object(Bucket=bucket, Key=key)
+        etag, size = head["ETag"], head["ContentLength"]
+        path = self._entry_path(etag, size, key)
+
+        with open(path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                if os.path.exists(path):
+                    os.utime(path)  # mtime doubles as the LRU clock and starts the eviction grace period
+                    print(f"[S3 CACHE] Hit {key}")
+                    return path
+
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another process may have finished the same download while we waited for the lock
+                if not os.path.exists(path):
+                    start = time.perf_counter()
+                    partial = f"{path}.part-{os.getpid()}"
+                    try:
+                        self.s3_client.download_file(bucket, key, partial, Config=self.transfer_config)
+                        if os.path.getsize(partial) != size:
+                            raise IOError(f"{key} changed while it was being downloaded")
+                        os.replace(partial, path)
+                    finally:
+                        if os.path.exists(partial):
+                            os.remove(partial)
+                    record_span("s3_download", time.perf_counter() - start)
+                    print(f"[S3 CACHE] Downloaded {key} ({size / MB:.1f} MB) in {time.perf_counter() - start:.2f}s")
+                else:
+                    os.utime(path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep: str):
+        with open(os.path.join(self.root, ".evict.lock"), "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return  # another process is already evicting
+
+            entries = []
+            for name in os.listdir(self.root):
+                path = os.path.join(self.root, name)
+                if name.startswith(".") or name.endswith(".lock") or ".part-" in name:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            used = sum(size for _, size, _ in entries)
+            for mtime, size, path in sorted(entries):
+                if used <= self.max_bytes:
+                    break
+                if path == keep or time.time() - mtime < S3_CACHE_EVICT_GRACE_SECONDS:
+                    continue
+                if self._remove_unused(path):
+                    used -= size
+                    print(f"[S3 CACHE] Evicted {os.path.basename(path)} ({size / MB:.1f} MB)")
+
+    def _remove_unused(self, path: str) -> bool:
+        with open(path + ".lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # being fetched or downloaded
+            try:
+                # A fetch may have touched it since the directory was listed
+                if time.time() - os.stat(path).st_mtime < S3_CACHE_EVICT_GRACE_SECONDS:
+                    return False
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
@@ -2,8 +2,13 @@ import boto3
 import os
 from dotenv import load_dotenv
 load_dotenv()
-from app.redis_utils import get_file_metadata
+from app.redis_utils import get_file_metadata, update_file_metadata
+from app.s3_cache import S3DiskCache
 from typing import Tuple
+import posixpath
+import asyncio
+import hashlib
+import json
 
 S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 s3_client = boto3.client(
@@ -12,6 +17,7 @@ s3_client = boto3.client(
     aws_access_key_id = os.getenv("AWS_ACCESS_KEY_ID"),
     aws_secret_access_key = os.getenv("AWS_SECRET_ACCESS_KEY")
 )
+s3_cache = S3DiskCache(s3_client)
 
 def generate_presigned_url(user_id: str, upload_id: str, filename: str, expiration: int = 3600) -> Tuple[str, str]:
     s3_key = f"{user_id}/uploads/{upload_id}/{filename}.csv"
@@ -27,13 +33,109 @@ def generate_presigned_url(user_id: str, upload_id: str, filename: str, expirati
     )
     return presigned_url, s3_key
 
+async def generate_presigned_url_async(user_id: str, upload_id: str, filename: str, expiration: int = 3600) -> Tuple[str, str]:
+    # boto3 is synchronous (and loads credentials lazily), so signing runs off the event loop
+    return await asyncio.to_thread(generate_presigned_url, user_id, upload_id, filename, expiration)
+
 def download_file_from_s3(file_id):
     file_meta = get_file_metadata(file_id)
     if not file_meta:
         raise Exception("File metadata not found for file_id: " + file_id)
 
-    key = file_meta["s3_path"]  
-    local_path = f"/tmp/{file_id}.csv"
+    return s3_cache.fetch(S3_BUCKET_NAME, file_meta["s3_path"])
+
+def download_dataset(file_id):
+    # Prefer the typed Parquet artifact written after the first load over re-parsing the raw CSV
+    file_meta = get_file_metadata(file_id)
+    if not file_meta:
+        raise Exception("File metadata not found for file_id: " + file_id)
+
+    parquet_key = file_meta.get("parquet_path")
+    if not parquet_key:
+        return download_file_from_s3(file_id)
+
+    return s3_cache.fetch(S3_BUCKET_NAME, parquet_key)
+
+def upload_parquet_artifact(file_id, local_path):
+    file_meta = get_file_metadata(file_id)
+    if not file_meta:
+        raise Exception("File metadata not found for file_id: " + file_id)
+
+    # Stored next to the raw upload: user_id/uploads/upload_id/<file_id>.parquet
+    key = posixpath.join(posixpath.dirname(file_meta["s3_path"]), f"{file_id}.parquet")
+    s3_client.upload_file(local_path, S3_BUCKET_NAME, key, ExtraArgs={"ContentType": "application/vnd.apache.parquet"})
+    update_file_metadata(file_id, {"parquet_path": key})
+    return key
+
+def get_dataset_fingerprint(file_id):
+    # ETag + size of the raw upload: re-uploads of identical files get the same fingerprint
+    file_meta = get_file_metadata(file_id)
+    if not file_meta:
+        raise Exception("File metadata not found for file_id: " + file_id)
+    if file_meta.get("fingerprint"):
+        return file_meta["fingerprint"]
+
+    head = s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=file_meta["s3_path"])
+    fingerprint = hashlib.sha256(f"{head['ETag']}:{head['ContentLength']}".encode()).hexdigest()[:32]
+    update_file_metadata(file_id, {"fingerprint": fingerprint})
+    return fingerprint
+
+def upload_profile_artifact(file_id, body: str):
+    file_meta = get_file_metadata(file_id)
+    if not file_meta:
+        raise Exception("File metadata not found for file_id: " + file_id)
+
+    key = posixpath.join(posixpath.dirname(file_meta["s3_path"]), f"{file_id}.profile.json")
+    s3_client.put_object(Bucket=S3_BUCKET_NAME, Key=key, Body=body.encode("utf-8"), ContentType="application/json")
+    update_file_metadata(file_id, {"profile_path": key})
+    return key
+
+def read_profile_artifact(file_id):
+    file_meta = get_file_metadata(file_id)
+    if not file_meta or not file_meta.get("profile_path"):
+        return None
+    return s3_client.get_object(Bucket=S3_BUCKET_NAME, Key=file_meta["profile_path"])["Body"].read().decode("utf-8")
+
+def append_chunk_key(s3_path: str, append_id: str) -> str:
+    # Raw appended CSVs sit next to the original upload: user_id/uploads/upload_id/appends/<append_id>.csv
+    return posixpath.join(posixpath.dirname(s3_path), "appends", f"{append_id}.csv")
+
+def generate_presigned_append_url(s3_path: str, append_id: str, expiration: int = 3600) -> Tuple[str, str]:
+    s3_key = append_chunk_key(s3_path, append_id)
+    presigned_url = s3_client.generate_presigned_url(
+        "put_object",
+        Params={"Bucket": S3_BUCKET_NAME, "Key": s3_key, "ContentType": "text/csv"},
+        ExpiresIn=expiration
+    )
+    return presigned_url, s3_key
+
+async def generate_presigned_append_url_async(s3_path: str, append_id: str, expiration: int = 3600) -> Tuple[str, str]:
+    return await asyncio.to_thread(generate_presigned_append_url, s3_path, append_id, expiration)
+
+def download_append_parts(file_meta: dict) -> list:
+    return [s3_cache.fetch(S3_BUCKET_NAME, key) for key in json.loads(file_meta.get("parquet_parts") or "[]")]
+
+def applied_append_chunks(file_meta: dict) -> list:
+    # S3 keys of the CSV chunks already stored as parts, so a repeated /append_complete/ or redelivered task is a no-op
+    return json.loads(file_meta.get("applied_chunks") or "[]")
+
+def next_dataset_fingerprint(fingerprint: str, chunk_key: str) -> str:
+    # Chained over the appended chunks, so files with the same upload and the same appends still share caches
+    head = s3_client.head_object(Bucket=S3_BUCKET_NAME, Key=chunk_key)
+    return hashlib.sha256(f"{fingerprint}:{head['ETag']}:{head['ContentLength']}".encode()).hexdigest()[:32]
+
+def upload_append_part(file_id, local_path, version: int, fingerprint: str, chunk_key: str):
+    # The metadata update is the commit point: version, fingerprint, part list and applied chunks change together
+    file_meta = get_file_metadata(file_id, use_cache=False)
+    if not file_meta:
+        raise Exception("File metadata not found for file_id: " + file_id)
 
-    s3_client.download_file(S3_BUCKET_NAME, key, local_path)
-    return local_path
+    key = posixpath.join(posixpath.dirname(file_meta["s3_path"]), "parts", f"{file_id}-{version:05d}.parquet")
+    s3_client.upload_file(local_path, S3_BUCKET_NAME, key, ExtraArgs={"ContentType": "application/vnd.apache.parquet"})
+    parts = json.loads(file_meta.get("parquet_parts") or "[]") + [key]
+    applied = applied_append_chunks(file_meta) + [chunk_key]
+    update_file_metadata(file_id, {
+        "parquet_parts": json.dumps(parts), "applied_chunks": json.dumps(applied),
+        "version": version, "fingerprint": fingerprint,
+    })
+    return key
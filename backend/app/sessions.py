@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import re
+import uuid
+from typing import Dict, Optional
+from app.redis_utils import redis_client, async_redis_client, get_file_metadata_async
+from app.answer_cache import dataset_key
+from dotenv import load_dotenv
+load_dotenv()
+
+# A session names several uploads as tables of one DuckDB connection. Workers pool and route it under its
+# ref ("session:<id>") the same way they handle a single file_id.
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))
+SESSION_PREFIX = "session:"
+MAX_SESSION_TABLES = int(os.getenv("MAX_SESSION_TABLES", "8"))
+TABLE_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]{0,62}$")
+RESERVED_TABLE_NAMES = {"data", "chunk", "chunk_raw", "result"}
+
+
+def session_ref(session_id: str) -> str:
+    return f"{SESSION_PREFIX}{session_id}"
+
+
+def is_session_ref(dataset_id: str) -> bool:
+    return dataset_id.startswith(SESSION_PREFIX)
+
+
+def session_id_from_ref(ref: str) -> str:
+    return ref[len(SESSION_PREFIX):]
+
+
+def validate_session_tables(tables: Dict[str, str]):
+    if not tables:
+        raise ValueError("A session needs at least one table")
+    if len(tables) > MAX_SESSION_TABLES:
+        raise ValueError(f"A session can have at most {MAX_SESSION_TABLES} tables")
+    for name in tables:
+        if not TABLE_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid table name: {name!r}")
+        if name.lower() in RESERVED_TABLE_NAMES:
+            raise ValueError(f"Table name {name!r} is reserved")
+
+
+async def create_session_async(tables: Dict[str, str]) -> str:
+    session_id = str(uuid.uuid4())
+    # Stored as a list: table order matters, the first table is also exposed as `data`
+    await async_redis_client.set(f"session:{session_id}", json.dumps(list(tables.items())), ex=SESSION_TTL)
+    return session_id
+
+
+def get_session(session_id: str) -> Optional[Dict[str, str]]:
+    raw = redis_client.get(f"session:{session_id}")
+    return dict(json.loads(raw)) if raw else None
+
+
+async def get_session_async(session_id: str) -> Optional[Dict[str, str]]:
+    raw = await async_redis_client.get(f"session:{session_id}")
+    return dict(json.loads(raw)) if raw else None
+
+
+def session_fingerprint(fingerprints: Dict[str, str]) -> str:
+    # Changes whenever a member file is appended to, like a single file's fingerprint
+    joined = ";".join(f"{name}={fp}" for name, fp in fingerprints.items())
+    return hashlib.sha256(joined.encode()).hexdigest()[:32]
+
+
+async def session_dataset_key_async(session_id: str) -> Optional[str]:
+    tables = await get_session_async(session_id)
+    if not tables:
+        return None
+    fingerprints = {}
+    for name, file_id in tables.items():
+        file_meta = await get_file_metadata_async(file_id)
+        if not file_meta:
+            return None
+        fingerprints[name] = dataset_key(file_id, file_meta)
+    return session_fingerprint(fingerprints)
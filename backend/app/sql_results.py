@@ -0,0 +1,59 @@
+import json
+import os
+import uuid
+from typing import Optional
+import duckdb
+from app.redis_utils import redis_client
+from app.s3_utils import S3_BUCKET_NAME, s3_cache
+from app.tool_cache import TOOL_CACHE_TTL
+from dotenv import load_dotenv
+load_dotenv()
+
+# Cached SQL answers embed continuation tokens, so a token must live as long as the tool cache entry
+SQL_RESULT_TTL = int(os.getenv("SQL_RESULT_TTL", str(TOOL_CACHE_TTL)))
+SQL_PAGE_SIZE = int(os.getenv("SQL_PAGE_SIZE", "100"))
+SQL_MAX_PAGE_SIZE = 1000
+
+
+def save_sql_result(s3_key: str, rows: int, columns: list) -> str:
+    result_id = uuid.uuid4().hex
+    redis_client.set(
+        f"sql_result:{result_id}",
+        json.dumps({"s3_key": s3_key, "rows": rows, "columns": columns}),
+        ex=SQL_RESULT_TTL,
+    )
+    return result_id
+
+
+def continuation_token(result_id: str, offset: int) -> str:
+    return f"{result_id}:{offset}"
+
+
+def parse_token(token: str):
+    result_id, _, offset = token.partition(":")
+    if not result_id or not offset.isdigit():
+        raise ValueError("Malformed continuation token")
+    return result_id, int(offset)
+
+
+def get_sql_page(token: str, limit: Optional[int] = None) -> Optional[dict]:
+    # Reads one page from the stored Parquet result, using the local download cache across pages
+    result_id, offset = parse_token(token)
+    raw = redis_client.get(f"sql_result:{result_id}")
+    if not raw:
+        return None
+    result = json.loads(raw)
+    limit = min(max(int(limit or SQL_PAGE_SIZE), 1), SQL_MAX_PAGE_SIZE)
+
+    local_path = s3_cache.fetch(S3_BUCKET_NAME, result["s3_key"])
+    with duckdb.connect() as conn:
+        page = conn.execute("SELECT * FROM read_parquet(?) LIMIT ? OFFSET ?", [local_path, limit, offset]).df()
+
+    next_offset = offset + len(page)
+    return {
+        "columns": result["columns"],
+        "total_rows": result["rows"],
+        "offset": offset,
+        "rows": json.loads(page.to_json(orient="records", date_format="iso")),
+        "next_token": continuation_token(result_id, next_offset) if next_offset < result["rows"] else None,
+    }
@@ -0,0 +1,30 @@
+import json
+import time
+from typing import Optional
+import redis
+from app.redis_utils import redis_client
+
+TASK_EVENTS_TTL = 600
+FINAL_STAGES = ("done", "error")
+
+
+def task_events_key(task_id: str) -> str:
+    return f"task_events:{task_id}"
+
+
+def publish_task_event(task_id: Optional[str], stage: str, data: Optional[dict] = None):
+    # Events are appended to a list (for late subscribers) and published on a channel of the same name
+    if not task_id:
+        return
+    key = task_events_key(task_id)
+    try:
+        seq = redis_client.incr(f"{key}:seq")
+        event = json.dumps({"seq": seq, "stage": stage, "ts": time.time(), **(data or {})}, default=str)
+        pipe = redis_client.pipeline()
+        pipe.rpush(key, event)
+        pipe.expire(key, TASK_EVENTS_TTL)
+        pipe.expire(f"{key}:seq", TASK_EVENTS_TTL)
+        pipe.publish(key, event)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"[EVENTS] Failed to publish {stage} for {task_id}: {e}")
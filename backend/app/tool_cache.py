@@ -0,0 +1,59 @@
+import os
+import re
+import json
+import hashlib
+from typing import Optional
+import redis
+from app.redis_utils import redis_client
+from dotenv import load_dotenv
+load_dotenv()
+
+# Plot objects stay in S3, so entries can outlive the answer cache; only the presigned URL is re-issued
+TOOL_CACHE_TTL = int(os.getenv("TOOL_CACHE_TTL", "86400"))
+
+
+# Quoted strings and identifiers, whose whitespace is part of the query's meaning
+SQL_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+
+def _collapse_whitespace(sql: str) -> str:
+    # A run containing a newline stays a newline, so a "-- comment" never swallows the next line
+    return re.sub(r"\s+", lambda m: "\n" if "\n" in m.group() else " ", sql)
+
+
+def canonical_sql(query: str) -> str:
+    parts = SQL_QUOTED.split(query)
+    # Odd parts are the quoted literals, kept verbatim
+    query = "".join(part if i % 2 else _collapse_whitespace(part) for i, part in enumerate(parts))
+    return query.strip().rstrip(";").strip()
+
+
+def canonical_args(tool: str, args: dict) -> str:
+    args = {k: v for k, v in args.items() if k != "file_id" and v is not None}
+    if tool == "sql_executor" and "query" in args:
+        args["query"] = canonical_sql(args["query"])
+    return json.dumps(args, sort_keys=True, default=str)
+
+
+def tool_cache_key(dataset: str, tool: str, args: dict) -> str:
+    digest = hashlib.sha256(canonical_args(tool, args).encode()).hexdigest()[:32]
+    return f"tool:{dataset}:{tool}:{digest}"
+
+
+def get_cached_tool_result(dataset: str, tool: str, args: dict) -> Optional[dict]:
+    try:
+        cached = redis_client.get(tool_cache_key(dataset, tool, args))
+    except redis.RedisError as e:
+        print(f"[TOOL CACHE] Lookup failed: {e}")
+        return None
+    if cached:
+        print(f"[TOOL CACHE] Hit for {tool} {canonical_args(tool, args)}")
+        return json.loads(cached)
+    return None
+
+
+def cache_tool_result(dataset: str, tool: str, args: dict, result: dict):
+    try:
+        redis_client.set(tool_cache_key(dataset, tool, args), json.dumps(result), ex=TOOL_CACHE_TTL)
+    except redis.RedisError as e:
+        print(f"[TOOL CACHE] Store failed: {e}")
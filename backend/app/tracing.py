@@ -0,0 +1,151 @@
+import atexit
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import redis
+from dotenv import load_dotenv
+load_dotenv()
+
+# Spans are aggregated in memory and pushed to Redis every few seconds, so every process
+# (API and each Celery child) contributes to the same histograms without a round-trip per span
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+TRACE_TTL = int(os.getenv("TRACE_TTL", "3600"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_STAGES_KEY = "metrics:stages"
+
+# Task id of the question being answered on this thread; spans recorded under it form the task's trace
+current_task_id: contextvars.ContextVar = contextvars.ContextVar("current_task_id", default=None)
+
+
+def metrics_key(stage: str) -> str:
+    return f"metrics:latency:{stage}"
+
+
+def trace_key(task_id: str) -> str:
+    return f"trace:{task_id}"
+
+
+class SpanRecorder:
+    def __init__(self, flush_seconds: float = METRICS_FLUSH_SECONDS):
+        self.flush_seconds = flush_seconds
+        self._histograms: Dict[str, Dict[str, float]] = {}
+        self._traces: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def record(self, stage: str, seconds: float, task_id: Optional[str] = None):
+        self._ensure_flusher()
+        bucket = next((str(b) for b in LATENCY_BUCKETS if seconds <= b), "+Inf")
+        with self._lock:
+            histogram = self._histograms.setdefault(stage, {})
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+            histogram["count"] = histogram.get("count", 0) + 1
+            histogram["sum"] = histogram.get("sum", 0.0) + seconds
+            if task_id:
+                span = json.dumps({"stage": stage, "ms": round(seconds * 1000, 2), "ts": time.time()})
+                self._traces.setdefault(task_id, []).append(span)
+
+    def flush(self):
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            traces, self._traces = self._traces, {}
+        if not histograms and not traces:
+            return
+        try:
+            # Imported here: recording spans (DuckDB loader, tools) must not need Redis configured at import time
+            from app.redis_utils import redis_client
+        except Exception as e:
+            print(f"[TRACE] Redis is not configured, dropping metrics: {e}")
+            return
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for stage, histogram in histograms.items():
+                pipe.sadd(METRICS_STAGES_KEY, stage)
+                for field, value in histogram.items():
+                    if field == "sum":
+                        pipe.hincrbyfloat(metrics_key(stage), field, value)
+                    else:
+                        pipe.hincrby(metrics_key(stage), field, int(value))
+            for task_id, spans in traces.items():
+                pipe.rpush(trace_key(task_id), *spans)
+                pipe.expire(trace_key(task_id), TRACE_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"[TRACE] Failed to push metrics: {e}")
+
+    def _ensure_flusher(self):
+        # Started lazily so each forked Celery child flushes its own spans
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+            self._histograms, self._traces = {}, {}
+        threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+
+span_recorder = SpanRecorder()
+atexit.register(span_recorder.flush)
+
+
+def record_span(stage: str, seconds: float, task_id: Optional[str] = None):
+    span_recorder.record(stage, seconds, task_id or current_task_id.get())
+
+
+@contextmanager
+def span(stage: str, task_id: Optional[str] = None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start, task_id)
+
+
+def traced(stage: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def get_task_trace_async(task_id: str) -> list:
+    from app.redis_utils import async_redis_client
+    return [json.loads(s) for s in await async_redis_client.lrange(trace_key(task_id), 0, -1)]
+
+
+async def render_latency_metrics_async() -> str:
+    # Prometheus text format; buckets are stored per-interval and made cumulative here
+    from app.redis_utils import async_redis_client
+    stages = sorted(await async_redis_client.smembers(METRICS_STAGES_KEY))
+    pipe = async_redis_client.pipeline(transaction=False)
+    for stage in stages:
+        pipe.hgetall(metrics_key(stage))
+    histograms = await pipe.execute()
+
+    name = "datasense_stage_latency_seconds"
+    lines = [
+        f"# HELP {name} Latency of each stage of the ask pipeline",
+        f"# TYPE {name} histogram",
+    ]
+    for stage, histogram in zip(stages, histograms):
+        cumulative = 0
+        for le in [str(b) for b in LATENCY_BUCKETS] + ["+Inf"]:
+            cumulative += int(histogram.get(le, 0))
+            lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {float(histogram.get("sum", 0))}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {int(histogram.get("count", 0))}')
+    return "\n".join(lines) + "\n"
@@ -2,9 +2,13 @@ import io
 import matplotlib.pyplot as plt
 import boto3
 import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
 from uuid import uuid4
-import tempfile
+import threading
 from app.redis_utils import get_file_metadata
+from app.tracing import span, record_span, current_task_id
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -12,35 +16,84 @@ load_dotenv()
 s3_bucket_name = os.getenv("S3_BUCKET_NAME")
 s3_client = boto3.client("s3")
 
-def upload_plot_to_s3(fig, file_id: str, prefix: str) -> str:
+# pyplot keeps a global current figure, so questions answered on parallel threads take turns drawing
+plot_lock = threading.Lock()
+
+PLOT_FORMATS = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+DEFAULT_PLOT_FORMAT = os.getenv("PLOT_FORMAT", "png")
+PLOT_DPI = int(os.getenv("PLOT_DPI", "100"))
+PIL_OPTIONS = {
+    "png": {"optimize": True},
+    "webp": {"quality": 80, "method": 6},
+}
+
+# Uploads run here so a task can hand out the presigned URL while the bytes are still in flight
+PLOT_UPLOAD_BACKGROUND = os.getenv("PLOT_UPLOAD_BACKGROUND", "true").lower() == "true"
+upload_executor = ThreadPoolExecutor(max_workers=int(os.getenv("PLOT_UPLOAD_WORKERS", "4")), thread_name_prefix="plot-upload")
+# How long a task waits for its plot upload before answering without the plot
+PLOT_UPLOAD_TIMEOUT = float(os.getenv("PLOT_UPLOAD_TIMEOUT", "60"))
+
+def upload_plot_to_s3(fig, file_id: str, prefix: str, fmt: Optional[str] = None) -> str:
+    key, upload = put_plot_to_s3(fig, file_id, prefix, fmt=fmt)
+    if upload is not None:
+        upload.result(timeout=PLOT_UPLOAD_TIMEOUT)
+    return presign_s3_key(key)
+
+def plot_format(fmt: Optional[str]) -> str:
+    fmt = (fmt or DEFAULT_PLOT_FORMAT).lower().lstrip(".")
+    return fmt if fmt in PLOT_FORMATS else "png"
+
+def render_plot(fig, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "svg":
+        fig.savefig(buffer, format="svg", metadata={"Date": None})
+    else:
+        fig.savefig(buffer, format=fmt, dpi=PLOT_DPI, pil_kwargs=PIL_OPTIONS[fmt])
+    return buffer.getvalue()
+
+def put_plot_to_s3(fig, file_id: str, prefix: str, fmt: Optional[str] = None,
+                   on_uploaded: Optional[Callable[[str], None]] = None) -> Tuple[str, Optional[Future]]:
+    # Renders now (the caller holds plot_lock) and uploads in the background. The key is returned right away
+    # with the upload's future (None when uploading inline); whoever hands out the URL must wait on it first.
     meta = get_file_metadata(file_id)
     if not meta:
         raise Exception("No metadata found")
 
+    fmt = plot_format(fmt)
     print(f"[DEBUG] Uploading plot for file_id: {file_id} with prefix: {prefix}")
     user_id = meta["user_id"]
     s3_base = f"{user_id}/uploads/{file_id}/{prefix}"
-    filename = f"{uuid4()}.png"
-    key = f"{s3_base}/{filename}"
-
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-        fig.savefig(tmp.name)
-        s3_client.upload_file(
-            tmp.name,
-            s3_bucket_name,
-            key,
-            ExtraArgs={"ContentType": "image/png"} 
-        )
-        os.unlink(tmp.name)
+    key = f"{s3_base}/{uuid4()}.{fmt}"
+    with span("plot_render"):
+        body = render_plot(fig, fmt)
+    task_id = current_task_id.get()  # the upload thread does not inherit the task's context
+
+    def upload():
+        start = time.perf_counter()
+        s3_client.put_object(Bucket=s3_bucket_name, Key=key, Body=body, ContentType=PLOT_FORMATS[fmt])
+        record_span("s3_upload", time.perf_counter() - start, task_id)
+        print(f"[PLOT] Uploaded {key} ({len(body) / 1024:.0f} KB) in {time.perf_counter() - start:.2f}s")
+        if on_uploaded:
+            on_uploaded(key)
+
+    if PLOT_UPLOAD_BACKGROUND:
+        future = upload_executor.submit(upload)
+        future.add_done_callback(_log_upload_error)
+        return key, future
+    upload()
+    return key, None
 
-    presigned_url = s3_client.generate_presigned_url(
+def _log_upload_error(future):
+    if future.exception():
+        print(f"[PLOT] Background upload failed: {future.exception()}")
+
+def presign_s3_key(key: str, expiration: int = 3600) -> str:
+    return s3_client.generate_presigned_url(
         "get_object",
         Params={"Bucket": s3_bucket_name, "Key": key},
-        ExpiresIn=3600
+        ExpiresIn=expiration
     )
 
-    return presigned_url
-
 def store_text_result(file_id: str, content: str, filename="results.json"):
     meta = get_file_metadata(file_id)
     if not meta:
@@ -49,9 +102,21 @@ def store_text_result(file_id: str, content: str, filename="results.json"):
     user_id = meta["user_id"]
     key = f"{user_id}/uploads/{file_id}/{filename}"
 
-    s3_client.put_object(
-        Bucket=s3_bucket_name,
-        Key=key,
-        Body=content.encode("utf-8"),
-        ContentType="application/json"
-    )
+    with span("s3_upload"):
+        s3_client.put_object(
+            Bucket=s3_bucket_name,
+            Key=key,
+            Body=content.encode("utf-8"),
+            ContentType="application/json"
+        )
+
+def store_result_file(file_id: str, local_path: str, filename: str, content_type: str) -> str:
+    # upload_file streams from disk in parts, so large query results never sit in memory
+    meta = get_file_metadata(file_id)
+    if not meta:
+        raise Exception("No metadata")
+
+    key = f"{meta['user_id']}/uploads/{file_id}/{filename}"
+    with span("s3_upload"):
+        s3_client.upload_file(local_path, s3_bucket_name, key, ExtraArgs={"ContentType": content_type})
+    return key
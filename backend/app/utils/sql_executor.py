@@ -1,9 +1,20 @@
 from typing import Optional, ClassVar , Type
 from pydantic import BaseModel
-from langchain_core.tools import BaseTool
+from langchain_core.tools import BaseTool, ToolException
 from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
-from app.utils.plot_uploader import store_text_result
-import json
+from app.utils.plot_uploader import store_result_file, store_text_result
+from app.tool_cache import get_cached_tool_result, cache_tool_result
+from app.sql_results import save_sql_result, continuation_token
+from app.tracing import span
+from uuid import uuid4
+import os
+import tempfile
+from dotenv import load_dotenv
+load_dotenv()
+
+# The answer shows a preview; the full result (up to the cap) is written to S3 as Parquet and paged by token
+SQL_PREVIEW_ROWS = int(os.getenv("SQL_PREVIEW_ROWS", "50"))
+SQL_MAX_RESULT_ROWS = int(os.getenv("SQL_MAX_RESULT_ROWS", "1000000"))
 
 class SQLQueryInput(BaseModel):
     query: str
@@ -18,18 +29,49 @@ class SQLExecutorTool(BaseTool):
 
     def _run(self, query, file_id: str):
         if not self.duckdb_loader or self.duckdb_loader.conn is None:
-            return "DuckDB not initialized. Please load a CSV first."
+            raise ToolException("DuckDB not initialized. Please load a CSV first.")
+
+        cached = get_cached_tool_result(self.duckdb_loader.fingerprint, self.name, {"query": query})
+        if cached:
+            return cached["answer"]
 
+        parquet_path = os.path.join(tempfile.gettempdir(), f"sql_result_{uuid4().hex}.parquet")
         try:
-            result_df = self.duckdb_loader.query(query)
-            result_str = result_df.to_string(index=False)
+            conn = self.duckdb_loader.conn
+            query = query.strip().rstrip(";")
+
+            # One execution: DuckDB streams the capped result to Parquet in row groups, and the preview
+            # is read back from that file instead of materializing everything in pandas
+            with span("duckdb_query"):
+                # The query sits on its own lines, so a trailing "-- comment" cannot swallow the wrapper
+                rows = conn.execute(
+                    f"COPY (SELECT * FROM (\n{query}\n) AS result LIMIT {SQL_MAX_RESULT_ROWS}) "
+                    f"TO '{parquet_path}' (FORMAT PARQUET, COMPRESSION ZSTD)"
+                ).fetchone()[0]
+                preview_df = conn.execute("SELECT * FROM read_parquet(?) LIMIT ?", [parquet_path, SQL_PREVIEW_ROWS]).df()
+            result_str = preview_df.to_string(index=False)
 
-            # Store the result in S3
-            store_text_result(file_id, result_df.to_json(orient="records", indent=2), filename="sql_result.json")
+            if rows <= SQL_PREVIEW_ROWS:
+                # The preview is the whole result; stored next to the dataset as before
+                store_text_result(file_id, preview_df.to_json(orient="records", indent=2), filename="sql_result.json")
+                answer = f"SQL query executed successfully. Result:\n{result_str}"
+            else:
+                key = store_result_file(file_id, parquet_path, f"sql_results/{uuid4()}.parquet", "application/vnd.apache.parquet")
+                result_id = save_sql_result(key, rows, list(preview_df.columns))
+                cap_note = " (result limit reached)" if rows >= SQL_MAX_RESULT_ROWS else ""
+                answer = (
+                    f"SQL query executed successfully. Showing the first {len(preview_df)} of {rows:,} rows{cap_note}:\n"
+                    f"{result_str}\n"
+                    f"More rows: /sql_page/{continuation_token(result_id, len(preview_df))}"
+                )
 
-            return f"SQL query executed successfully. Result:\n{result_str}"
+            cache_tool_result(self.duckdb_loader.fingerprint, self.name, {"query": query}, {"answer": answer})
+            return answer
         except Exception as e:
-            return f"SQL execution failed: {str(e)}"
+            raise ToolException(f"SQL execution failed: {str(e)}")
+        finally:
+            if os.path.exists(parquet_path):
+                os.remove(parquet_path)
         
     def _arun(self, *args, **kwargs):
         raise NotImplementedError("Async not supported for this tool.")
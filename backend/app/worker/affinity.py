@@ -0,0 +1,87 @@
+import bisect
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from app.worker.tasks import celery
+from dotenv import load_dotenv
+load_dotenv()
+
+# Per-worker queues taking part in affinity routing, e.g. "worker-0,worker-1"; empty keeps everything on the shared queue
+AFFINITY_QUEUES = [q.strip() for q in os.getenv("AFFINITY_QUEUES", "").split(",") if q.strip()]
+SHARED_QUEUE = os.getenv("SHARED_QUEUE", "celery")
+# A worker queue with more waiting messages than this is treated as overloaded and skipped
+AFFINITY_MAX_QUEUE_DEPTH = int(os.getenv("AFFINITY_MAX_QUEUE_DEPTH", "20"))
+AFFINITY_DEPTH_TTL = float(os.getenv("AFFINITY_DEPTH_TTL", "1.0"))
+HASH_RING_REPLICAS = 100
+
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+
+class HashRing:
+    # Adding or removing a queue only moves the files that hashed to its points
+    def __init__(self, nodes: List[str], replicas: int = HASH_RING_REPLICAS):
+        self._points = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [point for point, _ in self._points]
+
+    def node_for(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._points)
+        return self._points[i][1]
+
+
+class AffinityRouter:
+    def __init__(self, queues: List[str], depth_fn: Callable[[str], int],
+                 max_depth: int = AFFINITY_MAX_QUEUE_DEPTH, shared_queue: str = SHARED_QUEUE,
+                 depth_ttl: float = AFFINITY_DEPTH_TTL):
+        self.ring = HashRing(queues)
+        self.depth_fn = depth_fn
+        self.max_depth = max_depth
+        self.shared_queue = shared_queue
+        self.depth_ttl = depth_ttl
+        self.routed = 0
+        self.overflowed = 0
+        self._depths: Dict[str, tuple] = {}  # queue -> (checked_at, depth)
+        self._lock = threading.Lock()
+
+    def _depth(self, queue: str) -> int:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._depths.get(queue)
+            if cached and now - cached[0] < self.depth_ttl:
+                return cached[1]
+        try:
+            depth = self.depth_fn(queue)
+        except Exception as e:
+            print(f"[AFFINITY] Could not read depth of {queue}: {e}")
+            depth = self.max_depth + 1
+        with self._lock:
+            self._depths[queue] = (now, depth)
+        return depth
+
+    def route(self, file_id: str) -> str:
+        queue = self.ring.node_for(file_id)
+        if queue is None:
+            return self.shared_queue
+        if self._depth(queue) > self.max_depth:
+            # Any worker can take it from the shared queue; it will load the file itself
+            self.overflowed += 1
+            return self.shared_queue
+        self.routed += 1
+        return queue
+
+
+def broker_queue_depth(queue: str) -> int:
+    with celery.connection_for_write() as conn:
+        return conn.default_channel.queue_declare(queue=queue, passive=True).message_count
+
+
+affinity_router = AffinityRouter(AFFINITY_QUEUES, broker_queue_depth)
+
+
+def queue_for_file(file_id: str) -> str:
+    return affinity_router.route(file_id)
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict
+from dotenv import load_dotenv
+load_dotenv()
+
+DATASET_POOL_MAX_MB = int(os.getenv("DATASET_POOL_MAX_MB", "1024"))
+
+
+class DatasetPool:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (loader, size_bytes)
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}  # one load per key when task threads share the pool
+
+    def get_or_load(self, key: str, load_fn: Callable):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Loaded by another thread while this one waited
+                entry = self._entries.get(key)
+                if entry:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+            try:
+                loader = load_fn()
+                size = loader.memory_usage()
+                with self._lock:
+                    previous = self._entries.pop(key, None)
+                    if previous:
+                        self.used_bytes -= previous[1]
+                        previous[0].close()
+                    self._entries[key] = (loader, size)
+                    self.used_bytes += size
+                    self._evict()
+            finally:
+                with self._lock:
+                    self._load_locks.pop(key, None)
+        return loader
+
+    def refresh_size(self, key: str):
+        # For datasets that grew in place (appended chunks)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                size = entry[0].memory_usage()
+                self.used_bytes += size - entry[1]
+                self._entries[key] = (entry[0], size)
+                self._evict()
+
+    def discard(self, key: str):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self.used_bytes -= entry[1]
+                entry[0].close()
+
+    def _evict(self):
+        # Always keep the most recently used dataset, even if it alone exceeds the budget
+        while self.used_bytes > self.max_bytes and len(self._entries) > 1:
+            key, (loader, size) = self._entries.popitem(last=False)
+            self.used_bytes -= size
+            self.evictions += 1
+            loader.close()
+            print(f"[POOL] Evicted {key} ({size / 1e6:.1f} MB)")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "datasets": len(self._entries),
+                "used_mb": round(self.used_bytes / 1e6, 2),
+                "max_mb": round(self.max_bytes / 1e6, 2),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+dataset_pool = DatasetPool(max_bytes=DATASET_POOL_MAX_MB * 1024 * 1024)
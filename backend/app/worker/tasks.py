@@ -1,7 +1,17 @@
 from celery import Celery
-from app.s3_utils import download_file_from_s3
-from app.agents.agent_runner import run_agent_on_csv
-from app.redis_utils import cache_answer
+from celery.signals import worker_process_init
+from app.agents.agent_runner import load_dataset, load_session, run_agent_on_loader, write_dataset_profile, append_chunk
+from app.agents.graph.data_agent import init_agent_runtime
+from app.worker.dataset_pool import dataset_pool
+from app.answer_cache import cache_answer
+from app.task_events import publish_task_event
+from app.inflight import release_inflight
+from app.redis_utils import redis_client, get_file_metadata
+from app.sessions import is_session_ref, session_id_from_ref
+from app.tracing import record_span, current_task_id
+from app.utils.plot_uploader import PLOT_UPLOAD_TIMEOUT
+from app.s3_utils import applied_append_chunks
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -13,14 +23,148 @@ celery = Celery(
     backend=os.getenv("CELERY_RESULT_BACKEND")
 )
 
-@celery.task
-def process_question(file_id: str, question: str):
+# Questions of one batch share the loaded dataset; their LLM calls run on this many threads
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+APPEND_LOCK_TIMEOUT = int(os.getenv("APPEND_LOCK_TIMEOUT", "600"))
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    # Build the LLM client and compile the graph once per child instead of once per question
+    init_agent_runtime()
+
+def get_dataset(file_id: str, use_cache: bool = True):
+    # file_id is an upload's id or a session ref ("session:<id>") naming several uploads, pooled as one connection
+    if is_session_ref(file_id):
+        load = lambda: load_session(session_id_from_ref(file_id))
+    else:
+        load = lambda: load_dataset(file_id)
+
+    # Appends handled by another worker bump the version in the metadata; reload rather than answer from stale rows
+    loader = dataset_pool.get_or_load(file_id, load)
+    for source_id, version in loader.source_versions().items():
+        file_meta = get_file_metadata(source_id, use_cache=use_cache) or {}
+        if version < int(file_meta.get("version", 0)):
+            print(f"[POOL] {source_id} is at version {version} in {file_id}, reloading version {file_meta['version']}")
+            dataset_pool.discard(file_id)
+            return dataset_pool.get_or_load(file_id, load)
+    return loader
+
+@celery.task(bind=True)
+def process_question(self, file_id: str, question: str, claim_key: str = None, enqueued_at: float = None):
     start = time.time()
-    local_csv_path = download_file_from_s3(file_id)
-    answer = run_agent_on_csv(local_csv_path, question, file_id=file_id)
+    task_id = self.request.id
+    trace_token = current_task_id.set(task_id)
+    if enqueued_at:
+        record_span("queue_wait", max(start - enqueued_at, 0))
+    try:
+        try:
+            loader = get_dataset(file_id)
+            publish_task_event(task_id, "dataset_loaded", {"rows": loader.schema.row_count})
+            result = run_agent_on_loader(loader, question, file_id=loader.file_id, task_id=task_id)
+            answer = _await_uploads(result)
+        except Exception as e:
+            release_inflight(claim_key, task_id)
+            publish_task_event(task_id, "error", {"error": str(e)})
+            raise
+
+        # Cache before releasing the claim so a duplicate arriving in between finds the answer
+        _cache_result(loader.fingerprint, question, result)
+        release_inflight(claim_key, task_id)
+        publish_task_event(task_id, "done", {"answer": answer})
+        return answer
+    finally:
+        # Whatever step raised, the span is recorded and the worker thread's trace context is cleared
+        duration = time.time() - start
+        record_span("task_total", duration)
+        current_task_id.reset(trace_token)
+        print(f"[⏱] Total processing time: {duration:.2f} seconds")
+        print(f"[POOL] {dataset_pool.stats()}")
+
+@celery.task(bind=True)
+def process_question_batch(self, file_id: str, items: list):
+    # items are {"task_id", "question", "claim_key", "enqueued_at"}; every question reports its result under its own task id
+    start = time.time()
+    for item in items:
+        if item.get("enqueued_at"):
+            record_span("queue_wait", max(start - item["enqueued_at"], 0), item["task_id"])
+    try:
+        loader = get_dataset(file_id)
+    except Exception as e:
+        for item in items:
+            _fail_batch_item(self.backend, item, e)
+        raise
+
+    def answer_item(item: dict):
+        task_id = item["task_id"]
+        item_start = time.time()
+        current_task_id.set(task_id)  # executor threads start with an empty context
+        publish_task_event(task_id, "dataset_loaded", {"rows": loader.schema.row_count})
+        try:
+            result = run_agent_on_loader(loader, item["question"], file_id=loader.file_id, task_id=task_id)
+            answer = _await_uploads(result)
+        except Exception as e:
+            _fail_batch_item(self.backend, item, e)
+            return "FAILURE"
+
+        self.backend.store_result(task_id, answer, "SUCCESS")
+        _cache_result(loader.fingerprint, item["question"], result)
+        release_inflight(item.get("claim_key"), task_id)
+        publish_task_event(task_id, "done", {"answer": answer})
+        record_span("task_total", time.time() - item_start)
+        return "SUCCESS"
+
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(items)))) as executor:
+        states = list(executor.map(answer_item, items))
 
-    cache_answer(file_id, question, answer)
     duration = time.time() - start
-    print(f"[⏱] Total processing time: {duration:.2f} seconds")
-    return answer
+    print(f"[⏱] Answered batch of {len(items)} questions in {duration:.2f} seconds")
+    print(f"[POOL] {dataset_pool.stats()}")
+    return {item["task_id"]: state for item, state in zip(items, states)}
+
+def _await_uploads(result: dict) -> str:
+    # Plots upload while the rest of the graph runs; their URLs are handed out only once the objects exist
+    for upload in result.get("uploads") or []:
+        try:
+            upload.result(timeout=PLOT_UPLOAD_TIMEOUT)
+        except Exception as e:
+            print(f"[PLOT] Answer's plot upload failed: {e}")
+            result["answer"] = "Plot generated but failed to upload to S3."
+            result["failed"] = True
+    return result["answer"]
+
+def _cache_result(fingerprint: str, question: str, result: dict):
+    # Error answers (parse or tool failures, often transient) are not cached, and a cache write that fails
+    # must not fail a question that was answered
+    if result.get("failed"):
+        return
+    try:
+        cache_answer(fingerprint, question, result["answer"])
+    except Exception as e:
+        print(f"[CACHE] Could not cache answer: {e}")
 
+def _fail_batch_item(backend, item: dict, error: Exception):
+    backend.store_result(item["task_id"], error, "FAILURE")
+    release_inflight(item.get("claim_key"), item["task_id"])
+    publish_task_event(item["task_id"], "error", {"error": str(error)})
+
+@celery.task
+def prepare_dataset(file_id: str):
+    # Runs once the client has finished uploading: converts the CSV to Parquet, profiles it and warms this worker's pool.
+    # For a session it only warms the pool; each member file keeps its own profile.
+    loader = get_dataset(file_id)
+    if loader.profile is None and not is_session_ref(file_id):
+        write_dataset_profile(loader, file_id)
+    return loader.load_stats
+
+@celery.task
+def append_dataset(file_id: str, chunk_key: str):
+    # Routed like questions, so the chunk is usually applied to the copy already in this worker's pool
+    with redis_client.lock(f"append_lock:{file_id}", timeout=APPEND_LOCK_TIMEOUT, blocking_timeout=APPEND_LOCK_TIMEOUT):
+        file_meta = get_file_metadata(file_id, use_cache=False) or {}
+        if chunk_key in applied_append_chunks(file_meta):
+            print(f"[APPEND] {chunk_key} is already applied to {file_id}, skipping")
+            return {"version": int(file_meta.get("version", 0)), "rows_appended": 0, "already_applied": True}
+        loader = get_dataset(file_id, use_cache=False)
+        result = append_chunk(loader, file_id, chunk_key)
+    dataset_pool.refresh_size(file_id)
+    return result
@@ -0,0 +1,147 @@
+# Dataset pool hit rate with round-robin vs file_id affinity routing, using local worker processes.
+#
+# Each worker process has its own DatasetPool and loads real DuckDB tables from copies of a CSV, so
+# a pool miss costs what it costs in the Celery worker minus the S3 download. Questions arrive at a
+# fixed rate with Zipf-distributed file popularity.
+#
+# --children is the number of processes consuming each worker queue, each with its own DatasetPool. 1 models the
+# deployed threads pool (one pool per queue); more models a prefork worker, whose children split a queue's files.
+#   python -m benchmarks.affinity_routing --csv ../test.csv --workers 3 --files 20 --questions 400 --rate 20
+#   python -m benchmarks.affinity_routing --csv ../test.csv --workers 3 --children 4
+import argparse
+import json
+import multiprocessing as mp
+import os
+import queue
+import random
+import shutil
+import tempfile
+import time
+
+from app.worker.dataset_pool import DatasetPool
+from app.worker.affinity import AffinityRouter
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+
+
+def load(file_id: str, path: str) -> CSVToDuckDBLoader:
+    loader = CSVToDuckDBLoader(file_id=file_id)
+    loader.load_file(path)
+    return loader
+
+
+def worker_main(index, own_queue, shared_queue, done, stop, results, pool_mb):
+    pool = DatasetPool(max_bytes=pool_mb * 1024 * 1024)
+    load_seconds = 0.0
+    while not stop.is_set():
+        try:
+            file_id, path = own_queue.get(timeout=0.005)
+        except queue.Empty:
+            try:
+                file_id, path = shared_queue.get(timeout=0.005)
+            except queue.Empty:
+                continue
+
+        def timed_load():
+            nonlocal load_seconds
+            start = time.perf_counter()
+            loader = load(file_id, path)
+            load_seconds += time.perf_counter() - start
+            return loader
+
+        loader = pool.get_or_load(file_id, timed_load)
+        loader.conn.execute("SELECT count(*) FROM data").fetchone()
+        with done.get_lock():
+            done.value += 1
+
+    results.put((index, pool.stats(), load_seconds))
+
+
+def run_strategy(strategy, args, files, questions):
+    own_queues = [mp.Queue() for _ in range(args.workers)]
+    shared_queue = mp.Queue()
+    done, stop, results = mp.Value("i", 0), mp.Event(), mp.Queue()
+    workers = [
+        mp.Process(target=worker_main, args=(i, own_queues[i // args.children], shared_queue, done, stop, results, args.pool_mb))
+        for i in range(args.workers * args.children)
+    ]
+    for w in workers:
+        w.start()
+
+    names = [f"worker-{i}" for i in range(args.workers)]
+    router = AffinityRouter(names, lambda q: own_queues[names.index(q)].qsize(),
+                            max_depth=args.max_depth, shared_queue="shared", depth_ttl=0)
+
+    start = time.perf_counter()
+    interval = 1 / args.rate
+    for n, file_id in enumerate(questions):
+        target = router.route(file_id) if strategy == "affinity" else "shared"
+        (shared_queue if target == "shared" else own_queues[names.index(target)]).put((file_id, files[file_id]))
+        delay = start + (n + 1) * interval - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    while done.value < len(questions):
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stop.set()
+
+    per_worker = sorted(results.get() for _ in workers)
+    for w in workers:
+        w.join()
+
+    hits = sum(stats["hits"] for _, stats, _ in per_worker)
+    misses = sum(stats["misses"] for _, stats, _ in per_worker)
+    return {
+        "strategy": strategy,
+        "children_per_worker": args.children,
+        "questions": len(questions),
+        "hit_rate": round(hits / (hits + misses), 4),
+        "dataset_loads": misses,
+        "evictions": sum(stats["evictions"] for _, stats, _ in per_worker),
+        "load_seconds": round(sum(seconds for _, _, seconds in per_worker), 2),
+        "wall_seconds": round(elapsed, 2),
+        "overflowed_to_shared": router.overflowed if strategy == "affinity" else None,
+        "loads_per_worker": [stats["misses"] for _, stats, _ in per_worker],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dataset pool hit rates for round-robin and affinity routing")
+    parser.add_argument("--csv", default="../test.csv")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--questions", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=20, help="Questions per second")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Skew of file popularity")
+    parser.add_argument("--children", type=int, default=1, help="Processes (each with a DatasetPool) per worker queue")
+    parser.add_argument("--pool-mb", type=int, default=32, help="DatasetPool budget per process")
+    parser.add_argument("--max-depth", type=int, default=20, help="Worker queue depth that triggers the shared queue")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="Write the result JSON to this file")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="affinity_bench_")
+    try:
+        files = {}
+        for i in range(args.files):
+            path = os.path.join(tmpdir, f"file-{i}.csv")
+            shutil.copyfile(args.csv, path)
+            files[f"file-{i}"] = path
+
+        rng = random.Random(args.seed)
+        ids = list(files)
+        weights = [1 / (rank + 1) ** args.zipf for rank in range(len(ids))]
+        questions = rng.choices(ids, weights=weights, k=args.questions)
+
+        result = [run_strategy(strategy, args, files, questions) for strategy in ("round_robin", "affinity")]
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
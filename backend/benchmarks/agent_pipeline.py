@@ -0,0 +1,246 @@
+# Offline benchmark suite for the agent pipeline: loader, each tool, and DataAgent.run end to end.
+#
+# Runs against synthetic CSVs, a scripted LLM and in-process Redis/S3 stand-ins (see stand_ins.py),
+# so results are reproducible and comparable between commits:
+#   python -m benchmarks.agent_pipeline --sizes small,medium --widths narrow,wide --out base.json
+#   git checkout <other commit> && python -m benchmarks.agent_pipeline ... --out head.json
+#   python -m benchmarks.agent_pipeline --compare base.json head.json
+# Tool-cache lookups are forced to miss by giving each iteration a fresh dataset fingerprint.
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stand_ins import BENCH_USER, ScriptedChatModel, start_local_services
+from benchmarks.synthetic_data import SIZES, WIDTHS, column_names, dataset_path
+
+E2E_QUESTIONS = [
+    "What is the average num_0 for each cat_0?",
+    "Show the distribution of num_1",
+    "Plot num_2 over time",
+    "Give me summary statistics for num_0 and num_3",
+    "What is the average num_3?",
+    "Show me the rows where num_1 is above 500",
+]
+
+
+def summarize(latencies_ms: list) -> dict:
+    latencies_ms = sorted(latencies_ms)
+    def pct(p):
+        return round(latencies_ms[min(int(len(latencies_ms) * p), len(latencies_ms) - 1)], 2)
+    return {
+        "runs": len(latencies_ms),
+        "mean": round(statistics.mean(latencies_ms), 2),
+        "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+    }
+
+
+def timed(fn, iterations: int) -> list:
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def bench_loader(file_id: str, path: str, iterations: int, engines: list) -> list:
+    from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+
+    results = []
+    parquet_path = os.path.join(tempfile.gettempdir(), f"{file_id}.parquet")
+    for engine in engines:
+        stats = []
+        def load(_):
+            loader = CSVToDuckDBLoader(file_id=file_id, engine=engine if engine != "parquet" else None)
+            if engine == "parquet":
+                loader.load_parquet(parquet_path)
+            else:
+                loader.load_csv(path)
+            stats.append(loader.load_stats)
+            loader.close()
+
+        if engine == "parquet" and not os.path.exists(parquet_path):
+            loader = CSVToDuckDBLoader(file_id=file_id)
+            loader.load_csv(path)
+            loader.export_parquet(parquet_path)
+            loader.close()
+
+        latencies = timed(load, iterations)
+        results.append({
+            "benchmark": f"loader.{engine}",
+            "latency_ms": summarize(latencies),
+            "rows_per_second": round(stats[-1]["rows"] / (statistics.median(latencies) / 1000)),
+            "peak_rss_mb": max(s["peak_rss_mb"] for s in stats),
+        })
+    if os.path.exists(parquet_path):
+        os.remove(parquet_path)
+    return results
+
+
+def tool_cases(width: str) -> list:
+    from app.agents.tools.distribution_plotter import DistributionPlotTool
+    from app.agents.tools.summary_stats import SummaryStatsTool
+    from app.agents.tools.trend_plotter import TrendPlotTool
+    from app.utils.sql_executor import SQLExecutorTool
+
+    cols = column_names(width)
+    num, cat = cols["numeric"], cols["categorical"]
+    return [
+        ("sql_executor.group_by", SQLExecutorTool,
+         {"query": f"SELECT {cat[0]}, AVG({num[0]}) FROM data GROUP BY 1 ORDER BY 1"}),
+        ("sql_executor.large_result", SQLExecutorTool,
+         {"query": f"SELECT * FROM data WHERE {num[1]} > 500"}),
+        ("summary_stats", SummaryStatsTool,
+         {"columns": num[:10] + cat[:2], "metrics": ["mean", "median", "std", "p25", "p75", "nulls"]}),
+        ("distribution_plot.fixed", DistributionPlotTool, {"column": num[0]}),
+        ("distribution_plot.fd", DistributionPlotTool, {"column": num[0], "binning": "fd"}),
+        ("distribution_plot.quantile", DistributionPlotTool, {"column": num[0], "binning": "quantile"}),
+        ("trend_plot.date", TrendPlotTool, {"y": num[0], "x": cols["date"]}),
+        ("trend_plot.rowwise", TrendPlotTool, {"y": num[0]}),
+    ]
+
+
+def bench_tools(file_id: str, path: str, width: str, iterations: int) -> list:
+    from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+    from app.agents.tools.schema_profile import profile_dataset
+
+    loader = CSVToDuckDBLoader(file_id=file_id)
+    loader.load_csv(path)
+    # Tools run without the upload-time profile so every case measures its query
+    results = [{"benchmark": "dataset_profile", "latency_ms": summarize(timed(lambda _: profile_dataset(loader.conn), iterations))}]
+    for name, tool_cls, args in tool_cases(width):
+        tool = tool_cls(duckdb_loader=loader)
+        def run(i):
+            # Tools raise ToolException on failure, which aborts the run
+            loader.fingerprint = f"{file_id}:{name}:{time.time_ns()}:{i}"
+            tool.invoke({**args, "file_id": file_id})
+        results.append({"benchmark": f"tool.{name}", "latency_ms": summarize(timed(run, iterations))})
+    loader.close()
+    return results
+
+
+def bench_end_to_end(file_id: str, path: str, questions: int, concurrency: int, llm_latency_ms: float) -> list:
+    from app.agents.graph import data_agent
+    from app.agents.graph.data_agent import DataAgent
+    from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+
+    # The hosted model is swapped for the scripted one before any graph is compiled
+    data_agent._llm = ScriptedChatModel(latency_ms=llm_latency_ms)
+    data_agent._graphs.clear()
+
+    loader = CSVToDuckDBLoader(file_id=file_id)
+    loader.load_csv(path)
+    results = []
+    for mode in ("two_step", "single_call"):
+        agent = DataAgent(file_id=file_id, loader=loader)
+        agent.graph = data_agent.get_agent_graph(mode)
+
+        def ask(i):
+            loader.fingerprint = f"{file_id}:{mode}:{time.time_ns()}:{i}"
+            start = time.perf_counter()
+            agent.run(E2E_QUESTIONS[i % len(E2E_QUESTIONS)], file_id=file_id)
+            return (time.perf_counter() - start) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(ask, range(questions)))
+        elapsed = time.perf_counter() - started
+        results.append({
+            "benchmark": f"end_to_end.{mode}",
+            "concurrency": concurrency,
+            "llm_latency_ms": llm_latency_ms,
+            "questions_per_second": round(questions / elapsed, 2),
+            "latency_ms": summarize(latencies),
+        })
+    loader.close()
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> dict:
+    start_local_services()
+    import duckdb
+    from app.redis_utils import save_file_metadata
+
+    results = []
+    for size in args.sizes.split(","):
+        for width in args.widths.split(","):
+            path = dataset_path(args.data_dir, size, width)
+            file_id = f"bench-{size}-{width}"
+            save_file_metadata(file_id, os.path.basename(path), f"{BENCH_USER}/uploads/{file_id}/{os.path.basename(path)}", BENCH_USER)
+            dataset = {"size": size, "width": width, "rows": SIZES[size], "mb": round(os.path.getsize(path) / 1024 / 1024, 1)}
+
+            suite = bench_loader(file_id, path, args.iterations, args.engines.split(","))
+            suite += bench_tools(file_id, path, width, args.iterations)
+            if not args.skip_e2e:
+                suite += bench_end_to_end(file_id, path, args.questions, args.concurrency, args.llm_latency_ms)
+            results += [{**dataset, **r} for r in suite]
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "duckdb": duckdb.__version__,
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+
+def compare(base_path: str, head_path: str):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(head_path) as f:
+        head = json.load(f)
+    key = lambda r: (r["size"], r["width"], r["benchmark"])
+    before = {key(r): r for r in base["results"]}
+
+    print(f"{'dataset':<16} {'benchmark':<30} {base['commit']:>10} {head['commit']:>10} {'change':>8}  (p50 ms)")
+    for r in head["results"]:
+        old = before.get(key(r))
+        if not old:
+            continue
+        a, b = old["latency_ms"]["p50"], r["latency_ms"]["p50"]
+        change = (b - a) / a * 100 if a else 0.0
+        print(f"{r['size'] + '/' + r['width']:<16} {r['benchmark']:<30} {a:>10.2f} {b:>10.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="small,medium", help=f"comma-separated, from {list(SIZES)}")
+    parser.add_argument("--widths", default="narrow,wide", help=f"comma-separated, from {list(WIDTHS)}")
+    parser.add_argument("--engines", default="duckdb,pandas,parquet")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--questions", type=int, default=30, help="DataAgent.run calls per graph mode")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM round trip")
+    parser.add_argument("--skip-e2e", action="store_true")
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "datasense_bench_data"))
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    result = run(args)
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# Request throughput of a single uvicorn worker.
+#
+# Start the API with one worker, then point this script at it:
+#   uvicorn app.main:app --workers 1 --port 8000
+#   python -m benchmarks.api_throughput --endpoint ask --file-id <file_id> --concurrency 100 --duration 30
+#
+# Run it once on a checkout with the synchronous Redis/boto3 calls and once on this one
+# and compare requests_per_second and the latency percentiles in the JSON output.
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import Counter
+
+import httpx
+
+
+def build_request(endpoint: str, file_id: str, question: str):
+    # A random X-Forwarded-For spreads requests over rate limit buckets, as test.js does
+    headers = {"X-Forwarded-For": f"10.{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(1, 254)}"}
+    if endpoint == "ask":
+        return "POST", "/ask/", {"file_id": file_id, "question": question}, headers
+    if endpoint == "upload":
+        return "POST", "/upload/", {"filename": "bench.csv"}, headers
+    return "GET", "/cache_stats/", None, headers
+
+
+async def worker(client, args, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        method, path, body, headers = build_request(args.endpoint, args.file_id, args.question)
+        start = time.perf_counter()
+        try:
+            res = await client.request(method, path, json=body, headers=headers)
+            statuses[res.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(args):
+    latencies, statuses = [], Counter()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=30) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        await asyncio.gather(*(worker(client, args, deadline, latencies, statuses) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    def pct(p):
+        return round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 2) if latencies else None
+
+    return {
+        "endpoint": args.endpoint,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies), 2) if latencies else None,
+            "p50": pct(0.50), "p95": pct(0.95), "p99": pct(0.99),
+        },
+        "status_codes": {str(k): v for k, v in statuses.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure request throughput of the FastAPI app")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", choices=["ask", "upload", "cache_stats"], default="ask")
+    parser.add_argument("--file-id", default="")
+    parser.add_argument("--question", default="average discount")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--out", help="Write the result JSON to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
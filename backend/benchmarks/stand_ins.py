@@ -0,0 +1,123 @@
+# Local stand-ins so the agent pipeline can be benchmarked without network access:
+#   - ScriptedChatModel answers the router and argument-parser prompts with canned JSON
+#   - start_local_services() runs an in-process Redis (fakeredis over TCP) and S3 (moto)
+# start_local_services() must run before anything under app/ is imported, because the Redis and
+# S3 clients are created at import time from the environment.
+import json
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+BENCH_BUCKET = "bench-bucket"
+BENCH_USER = "bench-user"
+
+TOOL_KEYWORDS = [
+    ("distribution_plot", ("distribution", "histogram")),
+    ("trend_plot", ("over time", "trend")),
+    ("summary_stats", ("summary", "statistics")),
+]
+
+
+def pick_tool(question: str) -> str:
+    q = question.lower()
+    for tool, keywords in TOOL_KEYWORDS:
+        if any(k in q for k in keywords):
+            return tool
+    return "sql_executor"
+
+
+def scripted_args(tool: str, question: str, columns: List[str]) -> dict:
+    mentioned = [c for c in columns if re.search(rf"\b{re.escape(c)}\b", question)]
+    numeric = [c for c in mentioned if c.startswith("num_")] or [c for c in columns if c.startswith("num_")][:1]
+    categorical = [c for c in mentioned if c.startswith("cat_")]
+    date = next((c for c in columns if c.endswith("_date")), None)
+
+    if tool == "distribution_plot":
+        return {"column": numeric[0]}
+    if tool == "trend_plot":
+        return {"y": numeric[0], "x": date}
+    if tool == "summary_stats":
+        return {"columns": mentioned or numeric, "metrics": ["mean", "std", "p25", "p75", "nulls"]}
+    if "rows" in question.lower():
+        return {"query": f"SELECT * FROM data WHERE {numeric[0]} > 500 ORDER BY {numeric[0]} DESC"}
+    if categorical:
+        return {"query": f"SELECT {categorical[0]}, AVG({numeric[0]}) AS avg_{numeric[0]} FROM data GROUP BY 1 ORDER BY 1"}
+    return {"query": f"SELECT AVG({numeric[0]}) FROM data"}
+
+
+class ScriptedChatModel(BaseChatModel):
+    # Deterministic replacement for the hosted LLM; latency_ms simulates the network round trip
+    latency_ms: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        system = messages[0].content if len(messages) > 1 else ""
+        question = messages[-1].content
+        match = re.search(r"(?:column names in the dataset are|available columns are): (.*)\.\n", system)
+        columns = [c.strip() for c in match.group(1).split(",")] if match else []
+
+        if "Respond ONLY with the tool name" in system:
+            content = pick_tool(question)
+        elif "tool selector and argument extractor" in system:
+            tool = pick_tool(question)
+            content = json.dumps({"tool": tool, "args": scripted_args(tool, question, columns)})
+        else:
+            tool = next(
+                (t for t, marker in (
+                    ("distribution_plot", "distribution plots"),
+                    ("trend_plot", "plotting trends"),
+                    ("summary_stats", "summary statistics"),
+                ) if marker in system),
+                "sql_executor",
+            )
+            content = json.dumps(scripted_args(tool, question, columns))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_services():
+    from fakeredis import TcpFakeServer
+    from moto import mock_aws
+    import boto3
+
+    port = _free_port()
+    redis_server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    redis_server.daemon_threads = True  # connection handlers must not keep the process alive at exit
+    threading.Thread(target=redis_server.serve_forever, name="fake-redis", daemon=True).start()
+
+    os.environ.update({
+        "REDIS_HOST": "127.0.0.1",
+        "REDIS_PORT": str(port),
+        "AWS_REGION": "us-east-1",
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "S3_BUCKET_NAME": BENCH_BUCKET,
+        "S3_CACHE_DIR": tempfile.mkdtemp(prefix="bench_s3_cache_"),
+        "MPLBACKEND": "Agg",
+    })
+    # Uploads run inline so their cost lands in the measured call instead of a background thread
+    os.environ.setdefault("PLOT_UPLOAD_BACKGROUND", "false")
+
+    aws = mock_aws()
+    aws.start()
+    boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BENCH_BUCKET)
+    return redis_server, aws
@@ -0,0 +1,52 @@
+# Deterministic synthetic CSVs for the offline benchmarks.
+#
+# Values are derived from hash(row, column) inside DuckDB, so the same size and width produce the
+# same file on every machine regardless of thread count. Columns are named by type (num_*, cat_*,
+# order_date) so the scripted LLM in stand_ins.py can pick arguments without a real model.
+import os
+
+import duckdb
+
+SIZES = {"small": 10_000, "medium": 200_000, "large": 2_000_000}
+WIDTHS = {"narrow": (4, 2), "wide": (40, 10)}  # (numeric, categorical) columns, plus order_date
+CATEGORY_CARDINALITY = (5, 50, 500)
+
+
+def column_names(width: str) -> dict:
+    numeric, categorical = WIDTHS[width]
+    return {
+        "numeric": [f"num_{i}" for i in range(numeric)],
+        "categorical": [f"cat_{i}" for i in range(categorical)],
+        "date": "order_date",
+    }
+
+
+def generate_csv(path: str, rows: int, width: str = "narrow") -> str:
+    columns = column_names(width)
+    exprs = ["DATE '2020-01-01' + CAST(i % 1461 AS INTEGER) AS order_date"]
+    for k, name in enumerate(columns["numeric"]):
+        # Every 50th value is NULL so null handling is part of the measured work
+        exprs.append(
+            f"CASE WHEN hash(i, {k}) % 50 = 0 THEN NULL "
+            f"ELSE round((hash(i, {k}) % 1000000) / 1000.0 * (1 + {k} % 3), 3) END AS {name}"
+        )
+    for k, name in enumerate(columns["categorical"]):
+        cardinality = CATEGORY_CARDINALITY[k % len(CATEGORY_CARDINALITY)]
+        exprs.append(f"'{name}_' || CAST(hash(i, {k + 1000}) % {cardinality} AS VARCHAR) AS {name}")
+
+    with duckdb.connect() as conn:
+        conn.execute(
+            f"COPY (SELECT {', '.join(exprs)} FROM range({int(rows)}) t(i) ORDER BY i) TO ? (HEADER, DELIMITER ',')",
+            [path],
+        )
+    return path
+
+
+def dataset_path(data_dir: str, size: str, width: str) -> str:
+    # Generated once per size/width and reused across runs
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{size}_{width}.csv")
+    if not os.path.exists(path):
+        generate_csv(path + ".tmp", SIZES[size], width)
+        os.replace(path + ".tmp", path)
+    return path
@@ -0,0 +1,36 @@
+import datetime
+
+import pytest
+
+from app.agents.tools.duckdb_loader import CSVToDuckDBLoader
+
+
+def load(tmp_path, text: str) -> CSVToDuckDBLoader:
+    path = tmp_path / "base.csv"
+    path.write_text(text)
+    loader = CSVToDuckDBLoader(file_id="test")
+    loader.load_csv(str(path))
+    return loader
+
+
+def test_stage_chunk_accepts_non_iso_dates(tmp_path):
+    loader = load(tmp_path, "order_date,amount\n01/15/2020,1.5\n02/20/2020,2.0\n")
+    assert loader.column_types()["order_date"] == "DATE"
+
+    chunk = tmp_path / "chunk.csv"
+    chunk.write_text("amount,order_date\n3.25,03/25/2020\n")
+    assert loader.stage_chunk(str(chunk)) == 1
+    loader.insert_chunk()
+
+    rows = loader.conn.execute("SELECT order_date, amount FROM data ORDER BY order_date").fetchall()
+    assert rows[-1] == (datetime.date(2020, 3, 25), 3.25)
+    assert loader.version == 1
+
+
+def test_stage_chunk_rejects_values_of_another_type(tmp_path):
+    loader = load(tmp_path, "order_date,amount\n01/15/2020,1.5\n")
+    chunk = tmp_path / "chunk.csv"
+    chunk.write_text("order_date,amount\n03/25/2020,abc\n")
+    with pytest.raises(ValueError):
+        loader.stage_chunk(str(chunk))
+    assert loader.conn.execute("SELECT count(*) FROM data").fetchone()[0] == 1
@@ -1,6 +1,6 @@
 import streamlit as st
 from state import init_session_state
-from utils import get_presigned_upload, upload_file_to_s3
+from utils import get_presigned_upload, upload_file_to_s3, notify_upload_complete
 
 init_session_state()
 
@@ -21,6 +21,7 @@ if file:
                 print("[frontend] Presigned response:", resp)
                 upload_file_to_s3(resp["upload_url"], file.getvalue())
                 print("[frontend] File uploaded to S3.")
+                notify_upload_complete(resp["file_id"])
                 st.session_state.file_id = resp["file_id"]
                 st.session_state.upload_url = resp["upload_url"]
                 st.success("File uploaded!")
@@ -1,6 +1,7 @@
 import streamlit as st
+import time
 from state import init_session_state
-from utils import ask_question, poll_result
+from utils import ask_question, poll_result, stream_result, get_sql_page, STAGE_LABELS
 
 init_session_state()
 
@@ -18,19 +19,47 @@ if st.button("Ask"):
             resp = ask_question(st.session_state.file_id, question)
             task_id = resp.get("task_id")
 
-        with st.spinner("Waiting for result..."):
-            import time
-            while True:
-                result = poll_result(task_id)
-                if result["status"] == "done":
-                    break
-                time.sleep(1)
-
-            answer = result.get("answer")
-            if answer.endswith(".png") or "s3.amazonaws.com" in answer:
-                st.image(answer, use_container_width=True) 
-            else:
-                st.write(answer)
+        if resp.get("cached"):
+            result = {"status": "done", "answer": resp.get("answer")}
+        else:
+            result = None
+            with st.status("Waiting for result...") as status:
+                try:
+                    for event in stream_result(task_id):
+                        stage = event["stage"]
+                        if stage == "done":
+                            result = {"status": "done", "answer": event.get("answer")}
+                        elif stage == "error":
+                            result = {"status": "error", "error": event.get("error")}
+                        elif stage in STAGE_LABELS:
+                            detail = event.get("tool", "")
+                            status.update(label=f"{STAGE_LABELS[stage]} {detail}".strip())
+                except Exception as e:
+                    print(f"[frontend] Streaming failed, falling back to polling: {e}")
+
+                # Fallback when the stream is unavailable or timed out
+                while result is None:
+                    result = poll_result(task_id)
+                    if result["status"] != "done":
+                        result = None
+                        time.sleep(1)
+                status.update(label="Done", state="complete")
+
+        if result["status"] == "error":
+            raise Exception(result["error"])
+
+        answer = result.get("answer")
+        if answer.endswith(".png") or "s3.amazonaws.com" in answer:
+            st.image(answer, use_container_width=True) 
+        else:
+            st.write(answer)
+            # Large SQL results come back as a preview plus a continuation token for the remaining rows
+            if "More rows: /sql_page/" in answer:
+                token = answer.rsplit("/sql_page/", 1)[1].strip()
+                with st.expander("More rows"):
+                    page = get_sql_page(token, limit=500)
+                    st.dataframe(page["rows"], use_container_width=True)
+                    st.caption(f"Rows {page['offset'] + 1}-{page['offset'] + len(page['rows'])} of {page['total_rows']:,}")
 
 
     except Exception as e:
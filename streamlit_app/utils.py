@@ -1,4 +1,5 @@
 import requests
+import json
 
 BACKEND_URL = "http://backend:8000"  
 
@@ -18,6 +19,11 @@ def upload_file_to_s3(upload_url: str, file_bytes: bytes):
     res = requests.put(upload_url, data=file_bytes, headers=headers)
     res.raise_for_status()
 
+def notify_upload_complete(file_id: str):
+    res = requests.post(f"{BACKEND_URL}/upload_complete/", json={"file_id": file_id})
+    res.raise_for_status()
+    return res.json()
+
 def ask_question(file_id, question):
     print(f"[frontend] Sending POST to backend /upload with filename: {file_id} and question: {question}")
     res = requests.post("http://backend:8000/ask/",json={"file_id": file_id, "question": question})
@@ -30,4 +36,27 @@ def poll_result(task_id: str):
     res.raise_for_status()
     return res.json()
 
+def get_sql_page(token: str, limit: int = 100):
+    res = requests.get(f"{BACKEND_URL}/sql_page/{token}", params={"limit": limit})
+    res.raise_for_status()
+    return res.json()
+
+STAGE_LABELS = {
+    "dataset_loaded": "Dataset loaded",
+    "routed": "Tool selected",
+    "args_parsed": "Arguments parsed",
+    "query_done": "Query finished",
+    "plot_uploaded": "Plot uploaded",
+}
 
+def stream_result(task_id: str):
+    # Yields task events pushed by the backend over Server-Sent Events until the task is done
+    with requests.get(f"{BACKEND_URL}/stream/{task_id}", stream=True, timeout=(5, 60)) as res:
+        res.raise_for_status()
+        for line in res.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            event = json.loads(line[len("data:"):].strip())
+            yield event
+            if event["stage"] in ("done", "error", "timeout"):
+                return